@@ -0,0 +1,98 @@
+"""The original implementations, kept verbatim in behaviour as the baseline
+that the optimized code is checked and timed against."""
+import datetime
+
+from bs4 import BeautifulSoup
+
+MAX_PAYBACK_WEEKS = 1000
+
+
+def original_latest_dividend(html, today=None):
+    """``get_latest_ulty_dividend`` as first written: whole-page soup, first
+    table, first row paid within 14 days of ``today``."""
+    today = today or datetime.date.today()
+    soup = BeautifulSoup(html, "html.parser")
+    table = soup.find("table")
+    rows = table.find_all("tr")[1:]  # Skip header
+    for row in rows:
+        cols = row.find_all("td")
+        if len(cols) >= 3:
+            payment_date = cols[1].text.strip()
+            dividend = cols[2].text.strip().replace("$", "")
+            try:
+                pay_date = datetime.datetime.strptime(payment_date, "%b %d, %Y").date()
+                if (today - pay_date).days <= 14:
+                    return float(dividend)
+            except Exception:
+                continue
+    return None
+
+
+def original_drip(init_invest, price0, base_div_usd, years=10, exch=1.0, g_px=0.0, g_div=0.0,
+                  div_interval=1, extra_invest=0.0, extra_interval=1, guardrails_on=True,
+                  price_floor_usd=0.50, cut_threshold_usd=1.00, cut_percent=50.0,
+                  max_shares_growth_y=300.0):
+    """The MODE 4 week-by-week loop; takes the :class:`ulty_sim.DripParams` fields."""
+    total_weeks = int(years * 52)
+    shares = (init_invest / exch) / price0
+    total_div_cum = 0.0
+    div_this_year = 0.0
+    total_contrib = init_invest
+    shares_year_start = shares
+    records = []
+    for week in range(1, total_weeks + 1):
+        year_idx = (week - 1) // 52
+        px = price0 * ((1 + g_px) ** (week / 52.0))
+        if guardrails_on and price_floor_usd is not None and px < price_floor_usd:
+            px = price_floor_usd
+        div_per_period_usd = base_div_usd * ((1 + g_div) ** year_idx)
+        if guardrails_on and cut_threshold_usd is not None and px < cut_threshold_usd:
+            div_per_period_usd *= (1 - (cut_percent / 100.0))
+        if week % div_interval == 0 and div_per_period_usd > 0:
+            div_net_ccy = shares * div_per_period_usd * exch * 0.85
+        else:
+            div_net_ccy = 0.0
+        total_div_cum += div_net_ccy
+        div_this_year += div_net_ccy
+        shares += (div_net_ccy / exch) / px
+        if extra_invest and extra_invest != 0.0 and (week % extra_interval == 0):
+            total_contrib += extra_invest
+            shares += (extra_invest / exch) / px
+        if week % 52 == 0:
+            if guardrails_on and max_shares_growth_y and max_shares_growth_y > 0:
+                max_allowed = shares_year_start * (1.0 + max_shares_growth_y / 100.0)
+                if shares > max_allowed:
+                    shares = max_allowed
+            end_balance = shares * px * exch
+            next_12m = (shares * (base_div_usd * ((1 + g_div) ** (year_idx + 1)))
+                        * int(52 / div_interval) * exch * 0.85)
+            records.append({
+                "Year": year_idx + 1,
+                "End-of-Year Balance": round(end_balance, 2),
+                "Shares (end)": round(shares, 6),
+                "Price (end)": round(px, 4),
+                "Dividends Received (this year)": round(div_this_year, 2),
+                "Total Dividends (cum)": round(total_div_cum, 2),
+                "Next 12M Run-rate": round(next_12m, 2),
+                "YoC (initial)": round((next_12m / init_invest) * 100, 2) if init_invest > 0 else 0.0,
+                "YoC (contrib)": round((next_12m / total_contrib) * 100, 2) if total_contrib > 0 else 0.0,
+            })
+            div_this_year = 0.0
+            shares_year_start = shares
+    return records
+
+
+def original_reinvest_breakeven(investment, exchange_rate, stock_price=6.40, dividend_usd=0.0875,
+                                max_weeks=MAX_PAYBACK_WEEKS):
+    """MODE 3 week loop: weeks until reinvested net dividends add up to
+    ``investment``.  Returns ``(weeks, total_received)``; ``weeks`` stops at
+    ``max_weeks``."""
+    shares = (investment / exchange_rate) / stock_price
+    total_received = 0
+    weeks = 0
+    while total_received < investment and weeks < max_weeks:
+        dividend = shares * dividend_usd * exchange_rate * 0.85
+        total_received += dividend
+        shares += (dividend / exchange_rate) / stock_price
+        weeks += 1
+    return weeks, total_received
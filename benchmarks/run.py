@@ -0,0 +1,236 @@
+"""Offline benchmark suite for the fetchers, the scraper parse and the simulations.
+
+Run from the repository root::
+
+    python -m benchmarks.run                 # everything
+    python -m benchmarks.run --quick         # fewer repeats / smaller grids
+    python -m benchmarks.run --only parse,sim --json bench.json
+
+Upstream responses are replayed from ``benchmarks/fixtures`` by a local stub
+server, so timings do not depend on the network.  Every section also checks
+the optimized code against the original implementations in
+``benchmarks/reference.py``; the run exits with status 1 if any check fails.
+"""
+import argparse
+import datetime
+import json
+import math
+import random
+import sqlite3
+import statistics
+import sys
+import time
+
+import numpy as np
+
+import ulty_dividend_scraper as scraper
+import ulty_market
+from benchmarks.reference import (MAX_PAYBACK_WEEKS, original_drip, original_latest_dividend,
+                                  original_reinvest_breakeven)
+from benchmarks.stub_server import load_fixture, redirect_session, serve_fixtures
+from ulty_calc import payback_weeks_analytic
+from ulty_sim import DripParams, simulate_drip, simulate_drip_batch, simulate_drip_mc, to_records
+
+FIXTURE_DIVIDEND = 0.0897                   # newest distribution in every fixture
+FIXTURE_TODAY = datetime.date(2025, 10, 14)  # "today" for the 14-day freshness rule
+FIXTURE_ROWS = 70
+
+RESULTS = []
+CHECKS = []
+
+
+def bench(name, fn, repeat=5, n=1, baseline=None):
+    """Time ``fn`` ``repeat`` times; records best/median seconds per call."""
+    fn()  # warm-up (imports, caches that are meant to be warm)
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    row = {"name": name, "n": n, "best": min(times), "median": statistics.median(times)}
+    if baseline is not None:
+        ref = next(r for r in RESULTS if r["name"] == baseline)
+        row["speedup"] = ref["median"] / row["median"] if row["median"] else math.inf
+    RESULTS.append(row)
+    return row
+
+
+def check(name, ok, detail=""):
+    CHECKS.append({"name": name, "ok": bool(ok), "detail": detail})
+
+
+# === Fetchers and scraper (stub server) ===
+def bench_fetch(quick):
+    repeat = 3 if quick else 10
+    with serve_fixtures() as base:
+        adapters = dict(ulty_market.SESSION.adapters)
+        redirect_session(ulty_market.SESSION, base)
+        try:
+            sources = [(ulty_market.CircuitBreaker("yieldmax"), ulty_market._dividend_from_yieldmax),
+                       (ulty_market.CircuitBreaker("nasdaq"), ulty_market._dividend_from_nasdaq)]
+            bench("fetch: yieldmax (read_html)", lambda: ulty_market._dividend_from_yieldmax("ULTY", 5), repeat)
+            bench("fetch: nasdaq (json)", lambda: ulty_market._dividend_from_nasdaq("ULTY", 5), repeat)
+            bench("fetch: first_valid(yieldmax, nasdaq)",
+                  lambda: ulty_market.first_valid(sources, "ULTY", timeout=5), repeat)
+            for name, fn in sources:
+                check(f"fetch: {name.name} amount", fn("ULTY", 5)[0] == FIXTURE_DIVIDEND)
+            check("fetch: first_valid amount", ulty_market.first_valid(sources, "ULTY", 5)[0] == FIXTURE_DIVIDEND)
+        finally:
+            ulty_market.SESSION.adapters.clear()
+            ulty_market.SESSION.adapters.update(adapters)
+
+        session = redirect_session(scraper.make_session(), base)
+        url = scraper.STOCKANALYSIS_URL.format(ticker="ulty")
+        bench("scrape: original (GET + full soup)",
+              lambda: original_latest_dividend(session.get(url, headers=scraper.HEADERS).text, FIXTURE_TODAY), repeat)
+
+        def cold():
+            conn = scraper.open_store(":memory:")
+            scraper.update_history(conn, "ULTY", session)
+            return conn
+
+        bench("scrape: update_history (cold store)", cold, repeat, baseline="scrape: original (GET + full soup)")
+        conn = cold()
+        bench("scrape: update_history (304 revalidate)", lambda: scraper.update_history(conn, "ULTY", session),
+              repeat, baseline="scrape: original (GET + full soup)")
+        count = conn.execute("SELECT COUNT(*) FROM dividends").fetchone()[0]
+        check("scrape: rows stored", count == FIXTURE_ROWS, f"{count} rows")
+        conn.close()
+
+
+# === Parsing ===
+def bench_parse(quick):
+    repeat = 5 if quick else 20
+    html = load_fixture("stockanalysis_ulty.html")
+    bench("parse: original full-page soup", lambda: original_latest_dividend(html, FIXTURE_TODAY), repeat)
+    bench("parse: parse_dividend_rows", lambda: scraper.parse_dividend_rows(html), repeat,
+          baseline="parse: original full-page soup")
+
+    rows = scraper.parse_dividend_rows(html)
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(scraper.SCHEMA)
+    scraper.ingest(conn, "ULTY", rows)
+    cutoff = (FIXTURE_TODAY - datetime.timedelta(days=14)).isoformat()
+    latest = conn.execute("SELECT amount FROM dividends WHERE ticker = 'ULTY' AND pay_date >= ? "
+                          "ORDER BY pay_date DESC LIMIT 1", (cutoff,)).fetchone()[0]
+    check("parse: latest dividend matches original", latest == original_latest_dividend(html, FIXTURE_TODAY),
+          f"{latest}")
+    check("parse: row count", len(rows) == FIXTURE_ROWS, f"{len(rows)}")
+
+
+# === Simulations ===
+def random_params(rng, n, years):
+    return [DripParams(
+        init_invest=rng.choice([3_000.0, 100_000.0, 1_000_000.0]),
+        price0=rng.uniform(2.0, 12.0),
+        base_div_usd=rng.uniform(0.02, 0.15),
+        years=years,
+        exch=rng.choice([1.0, 32.5]),
+        g_px=rng.uniform(-0.4, 0.1),
+        g_div=rng.uniform(-0.2, 0.05),
+        div_interval=rng.choice([1, 4, 13]),
+        extra_invest=rng.choice([0.0, 0.0, 500.0]),
+        extra_interval=rng.choice([1, 4]),
+        guardrails_on=rng.random() < 0.8,
+        max_shares_growth_y=rng.choice([0.0, 50.0, 300.0]),
+    ) for _ in range(n)]
+
+
+def _same_records(new, old):
+    """Rounded records agree to the last rounded digit (float reassociation);
+    scenarios that overflow float64 only need to overflow on both sides."""
+    for a, b in zip(new, old):
+        for k, v in b.items():
+            w = a[k]
+            if not (w == v or not math.isfinite(v) and not math.isfinite(w)
+                    or abs(w - v) <= max(0.011, 1e-9 * abs(v))):
+                return f"year {b['Year']} {k}: {w} != {v}"
+    return "" if len(new) == len(old) else f"{len(new)} != {len(old)} years"
+
+
+def bench_sim(quick):
+    repeat = 3 if quick else 5
+    horizons = (1, 10, 30) if quick else (1, 10, 30, 50)
+    counts = (1, 100) if quick else (1, 100, 1000)
+    rng = random.Random(2024)
+    for years in horizons:
+        for n in counts:
+            ps = random_params(rng, n, years)
+            label = f"{years}y x {n}"
+            ref = None
+            if n * years <= 3_000:
+                ref = f"sim: original loop {label}"
+                bench(ref, lambda: [original_drip(**p.__dict__) for p in ps], repeat, n)
+            if n == 1:
+                bench(f"sim: simulate_drip {label}", lambda: simulate_drip(ps[0]), repeat, n, baseline=ref)
+            bench(f"sim: simulate_drip_batch {label}", lambda: simulate_drip_batch(ps), repeat, n, baseline=ref)
+
+            out = simulate_drip_batch(ps)
+            bad = ""
+            for i, p in enumerate(ps[:100]):
+                bad = _same_records(to_records({k: v[i] for k, v in out.items()}, p.init_invest),
+                                    original_drip(**p.__dict__))
+                if bad:
+                    break
+            check(f"sim: batch matches original {label}", not bad, bad)
+
+    p = DripParams(100_000.0, 6.4, 0.09, years=10, exch=32.5)
+    paths = 2_000 if quick else 10_000
+    bench(f"sim: monte carlo {paths:,} paths x 10y", lambda: simulate_drip_mc(p, n_paths=paths, seed=1), repeat, paths)
+
+
+# === MODE 3 payback ===
+def bench_payback(quick):
+    repeat = 3 if quick else 5
+    rng = np.random.default_rng(7)
+    n = 100 if quick else 500
+    price = rng.uniform(2.0, 12.0, n)
+    div = rng.uniform(0.005, 0.2, n)
+    invest = rng.choice([10_000.0, 100_000.0, 1_000_000.0], n)
+    bench(f"payback: original loop x {n}",
+          lambda: [original_reinvest_breakeven(i, 32.5, p, d) for i, p, d in zip(invest, price, div)], repeat, n)
+    bench(f"payback: payback_weeks_analytic x {n}", lambda: payback_weeks_analytic(price, div), repeat, n,
+          baseline=f"payback: original loop x {n}")
+
+    weeks = payback_weeks_analytic(price, div)
+    mismatched = 0
+    for i, p, d, w in zip(invest, price, div, weeks):
+        loop = original_reinvest_breakeven(i, 32.5, p, d)[0]
+        if loop < MAX_PAYBACK_WEEKS and loop != w or loop >= MAX_PAYBACK_WEEKS and w < MAX_PAYBACK_WEEKS:
+            mismatched += 1
+    check("payback: analytic matches loop", mismatched == 0, f"{mismatched} of {n} differ")
+
+
+SECTIONS = {"fetch": bench_fetch, "parse": bench_parse, "sim": bench_sim, "payback": bench_payback}
+
+
+def report(out=sys.stdout):
+    width = max(len(r["name"]) for r in RESULTS)
+    print(f"{'benchmark':<{width}}  {'best ms':>10}  {'median ms':>10}  {'speedup':>8}", file=out)
+    for r in RESULTS:
+        speedup = f"{r['speedup']:.1f}x" if "speedup" in r else ""
+        print(f"{r['name']:<{width}}  {r['best'] * 1e3:>10.2f}  {r['median'] * 1e3:>10.2f}  {speedup:>8}", file=out)
+    print(file=out)
+    for c in CHECKS:
+        print(f"{'✅' if c['ok'] else '❌'} {c['name']}" + (f" ({c['detail']})" if c["detail"] and not c["ok"] else ""),
+              file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline ULTY benchmarks.")
+    parser.add_argument("--quick", action="store_true", help="fewer repeats and smaller grids")
+    parser.add_argument("--only", help="comma-separated sections: " + ",".join(SECTIONS))
+    parser.add_argument("--json", help="also write results and checks to this file")
+    args = parser.parse_args(argv)
+
+    for name in (args.only.split(",") if args.only else SECTIONS):
+        SECTIONS[name](args.quick)
+    report()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"results": RESULTS, "checks": CHECKS}, f, indent=2)
+    return 0 if all(c["ok"] for c in CHECKS) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""Local HTTP server that replays the saved upstream responses.
+
+``serve_fixtures()`` starts a threaded server on 127.0.0.1 and returns its
+base URL; :class:`RedirectAdapter` sends requests for the real hosts to it,
+so the production fetchers run unchanged over a real (local) socket.
+Responses carry an ETag and honour ``If-None-Match`` with a 304, like the
+stockanalysis pages the scraper revalidates.
+"""
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from requests.adapters import HTTPAdapter
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# (host, path prefix) -> (fixture file, content type)
+ROUTES = {
+    ("stockanalysis.com", "/etf/"): ("stockanalysis_ulty.html", "text/html; charset=utf-8"),
+    ("yieldmaxetfs.com", "/"): ("yieldmax_ulty.html", "text/html; charset=utf-8"),
+    ("api.nasdaq.com", "/api/quote/"): ("nasdaq_ulty.json", "application/json"),
+}
+UPSTREAM_HOSTS = sorted({host for host, _ in ROUTES})
+
+
+def load_fixture(name, mode="r"):
+    with open(os.path.join(FIXTURE_DIR, name), mode) as f:
+        return f.read()
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        host = self.headers.get("X-Upstream-Host", "")
+        for (route_host, prefix), (name, ctype) in ROUTES.items():
+            if host == route_host and self.path.startswith(prefix):
+                break
+        else:
+            self.send_error(404)
+            return
+        body = load_fixture(name, "rb")
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@contextmanager
+def serve_fixtures():
+    """Run the stub server for the duration of the block; yields its base URL."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield "http://127.0.0.1:%d" % server.server_address[1]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class RedirectAdapter(HTTPAdapter):
+    """Rewrites ``https://<upstream>/...`` to the stub server, keeping the path."""
+
+    def __init__(self, base_url, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        request.headers["X-Upstream-Host"] = parts.netloc
+        request.url = self.base_url + parts.path + ("?" + parts.query if parts.query else "")
+        return super().send(request, **kwargs)
+
+
+def redirect_session(session, base_url):
+    """Mount :class:`RedirectAdapter` on ``session`` for every upstream host."""
+    adapter = RedirectAdapter(base_url)
+    for host in UPSTREAM_HOSTS:
+        session.mount("https://" + host + "/", adapter)
+    return session
@@ -0,0 +1,169 @@
+"""Headless batch runner for the ULTY calculators.
+
+Reads client portfolios from CSV or JSONL, computes every calculator for each
+row in vectorized chunks and streams the results to CSV or JSONL::
+
+    python ulty_batch.py portfolios.csv -o results.jsonl
+    cat portfolios.jsonl | python ulty_batch.py - --format jsonl --price 6.1 --fx 32.4
+
+Input columns (all but ``amount`` optional)::
+
+    id, amount, currency (THB|USD), years, price_growth (%/yr),
+    dividend_growth (%/yr), extra_invest, extra_freq (Weekly|Monthly),
+    dividend_freq (Weekly|Monthly|Quarterly), guardrails (true|false)
+
+Market inputs are fetched once per run (``--price``/``--fx``/``--dividend``
+override them).  Guardrail thresholds use the page defaults.
+
+``--ledger path.parquet`` (or any other name for a raw ``numpy.memmap``
+record file) also streams the weekly DRIP ledger of every portfolio, with
+``scenario`` the 0-based input row (see ``ulty_ledger.py``).
+"""
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from ulty_calc import (DIVIDEND_PER_SHARE_WEEKLY_DEFAULT, drip_final_batch, payback_weeks_analytic,
+                       weekly_dividend_batch)
+from ulty_ledger import LedgerWriter
+from ulty_sim import (CUT_PERCENT, CUT_THRESHOLD_USD, FREQ_TO_WEEKS, MAX_SHARES_GROWTH_Y, NET_OF_TAX,
+                      PRICE_FLOOR_USD, DripParams)
+
+DEFAULTS = {
+    "currency": "THB",
+    "years": 10,
+    "price_growth": 0.0,
+    "dividend_growth": 0.0,
+    "extra_invest": 0.0,
+    "extra_freq": "Weekly",
+    "dividend_freq": "Weekly",
+    "guardrails": True,
+}
+
+
+def read_portfolios(path, fmt, chunksize):
+    src = sys.stdin if path == "-" else path
+    if fmt == "jsonl":
+        return pd.read_json(src, lines=True, chunksize=chunksize)
+    return pd.read_csv(src, chunksize=chunksize)
+
+
+def _truthy(col):
+    return col.astype(str).str.strip().str.lower().isin(["1", "true", "yes", "y"])
+
+
+def compute_chunk(df, price, fx, dividend, ledger=None):
+    """Results frame for one chunk of portfolios (weekly rows go to ``ledger``)."""
+    df = df.copy()
+    if "id" not in df:
+        df["id"] = df.index
+    for col, default in DEFAULTS.items():
+        df[col] = df[col].fillna(default) if col in df else default
+    amount = df["amount"].astype(float).to_numpy()
+    is_thb = (df["currency"].astype(str).str.upper() == "THB").to_numpy()
+    exch = np.where(is_thb, fx, 1.0)
+
+    # MODE 2
+    weekly = weekly_dividend_batch(amount, price, exch, dividend)
+    # MODE 3 (at the live price and dividend)
+    payback_weeks = np.broadcast_to(payback_weeks_analytic(price, dividend), amount.shape)
+
+    # MODE 4
+    guard = _truthy(df["guardrails"]).to_numpy()
+    params = [
+        DripParams(
+            init_invest=a,
+            price0=price,
+            base_div_usd=dividend,
+            years=int(y),
+            exch=e,
+            g_px=gp / 100.0,
+            g_div=gd / 100.0,
+            div_interval=FREQ_TO_WEEKS.get(dfq, 1),
+            extra_invest=float(x),
+            extra_interval=1 if xf == "Weekly" else 4,
+            guardrails_on=bool(g),
+            price_floor_usd=PRICE_FLOOR_USD if g else None,
+            cut_threshold_usd=CUT_THRESHOLD_USD if g else None,
+            cut_percent=CUT_PERCENT if g else 0.0,
+            max_shares_growth_y=MAX_SHARES_GROWTH_Y if g else 0.0,
+        )
+        for a, y, e, gp, gd, dfq, x, xf, g in zip(
+            amount, df["years"], exch, df["price_growth"].astype(float), df["dividend_growth"].astype(float),
+            df["dividend_freq"], df["extra_invest"], df["extra_freq"], guard)
+    ]
+    drip = drip_final_batch(params)
+    if ledger is not None:
+        ledger.write(params)
+
+    out = pd.DataFrame({
+        "id": df["id"].to_numpy(),
+        "amount": amount,
+        "currency": np.where(is_thb, "THB", "USD"),
+        "shares": np.round(amount / exch / price, 6),
+        "weekly_dividend_gross": weekly,
+        "weekly_dividend_net": np.round(weekly * NET_OF_TAX, 2),
+        "monthly_dividend_net": np.round(weekly * NET_OF_TAX * 4, 2),
+        "payback_weeks": payback_weeks,
+        "years": df["years"].astype(int).to_numpy(),
+    })
+    for k, v in drip.items():
+        out[k] = v
+    return out
+
+
+def write_chunk(out, fh, fmt, first):
+    if fmt == "jsonl":
+        out.to_json(fh, orient="records", lines=True)
+    else:
+        out.to_csv(fh, header=first, index=False)
+    fh.flush()
+
+
+def market_inputs(args):
+    price, fx, dividend = args.price, args.fx, args.dividend
+    if price is None or fx is None or dividend is None:
+        import ulty_market
+        market = ulty_market.fetch_market_data(args.ticker)
+        price = price if price is not None else market.price
+        fx = fx if fx is not None else market.exchange_rate
+        if dividend is None:
+            dividend = market.dividend if market.dividend is not None else DIVIDEND_PER_SHARE_WEEKLY_DEFAULT
+    if not price or not fx:
+        raise SystemExit("could not fetch price/exchange rate; pass --price and --fx")
+    return price, fx, dividend
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch ULTY dividend / DRIP calculations.")
+    parser.add_argument("input", help="portfolio file (.csv or .jsonl), or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="output file, - for stdout")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="input/output format (default: from file name)")
+    parser.add_argument("--chunksize", type=int, default=5_000)
+    parser.add_argument("--ticker", default="ULTY")
+    parser.add_argument("--price", type=float, help="share price in USD")
+    parser.add_argument("--fx", type=float, help="THB per USD")
+    parser.add_argument("--dividend", type=float, help="dividend per share per week in USD")
+    parser.add_argument("--ledger", help="also write the weekly ledger here (.parquet or raw records)")
+    args = parser.parse_args(argv)
+
+    in_fmt = args.format or ("jsonl" if args.input.endswith((".jsonl", ".json")) else "csv")
+    out_fmt = args.format or ("jsonl" if args.output.endswith((".jsonl", ".json")) else in_fmt)
+    price, fx, dividend = market_inputs(args)
+
+    fh = sys.stdout if args.output == "-" else open(args.output, "w", newline="")
+    ledger = LedgerWriter(args.ledger) if args.ledger else None
+    try:
+        for i, chunk in enumerate(read_portfolios(args.input, in_fmt, args.chunksize)):
+            write_chunk(compute_chunk(chunk, price, fx, dividend, ledger), fh, out_fmt, first=i == 0)
+    finally:
+        if ledger is not None:
+            ledger.close()
+        if fh is not sys.stdout:
+            fh.close()
+
+
+if __name__ == "__main__":
+    main()
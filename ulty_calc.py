@@ -0,0 +1,163 @@
+"""Pure calculators behind the ULTY web app (no Streamlit, no network).
+
+Every function takes the market inputs (price, exchange rate, dividend per
+share) as arguments, so the same code serves the page and headless batch
+jobs (see ``ulty_batch.py``).  The scalar helpers keep the page's rounding;
+the ``*_batch`` variants take NumPy arrays and compute whole chunks at once.
+"""
+from dataclasses import replace
+
+import numpy as np
+
+from ulty_sim import NET_OF_TAX, WEEKS_PER_YEAR, DripParams, simulate_drip_batch
+
+# MODE 3 assumptions on the page
+REINVEST_STOCK_PRICE = 6.40
+REINVEST_DIVIDEND_USD = 0.0875
+DIVIDEND_PER_SHARE_WEEKLY_DEFAULT = 0.104  # fallback when no live dividend is available
+MAX_PAYBACK_YEARS = 200
+
+
+def calculate_weekly_dividend(amount_thb, stock_price_usd, exchange_rate, dividend_per_share):
+    usd = amount_thb / exchange_rate
+    shares = usd / stock_price_usd
+    dividend_usd = shares * dividend_per_share
+    return round(dividend_usd * exchange_rate, 2)
+
+
+def calculate_required_investment(target_weekly_dividend_thb, stock_price_usd, exchange_rate, dividend_per_share):
+    shares_needed = target_weekly_dividend_thb / (dividend_per_share * exchange_rate)
+    total_usd = shares_needed * stock_price_usd
+    total_thb = total_usd * exchange_rate
+    return round(shares_needed), round(total_thb, 2)
+
+
+def weekly_dividend_batch(amount, stock_price_usd, exch, dividend_per_share):
+    """Gross weekly dividend (same currency as ``amount``) for arrays of amounts."""
+    return np.round(np.asarray(amount, dtype=float) / exch / stock_price_usd * dividend_per_share * exch, 2)
+
+
+def drip_final_batch(params):
+    """Final-year MODE 4 figures for a list of :class:`DripParams`.
+
+    Scenarios are grouped by horizon and each group runs as one
+    :func:`ulty_sim.simulate_drip_batch` call.  Returns a dict of arrays in
+    the order of ``params``.
+    """
+    n = len(params)
+    cols = {k: np.empty(n) for k in ("end_balance", "total_dividends", "next_12m_runrate",
+                                     "yoc_initial", "yoc_contrib")}
+    by_years = {}
+    for i, p in enumerate(params):
+        by_years.setdefault(p.years, []).append(i)
+    for idx in by_years.values():
+        out = simulate_drip_batch([params[i] for i in idx])
+        init = np.array([params[i].init_invest for i in idx])
+        contrib = out["contrib_cum"][:, -1]
+        runrate = out["runrate"][:, -1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cols["end_balance"][idx] = out["balance"][:, -1]
+            cols["total_dividends"][idx] = out["div_cum"][:, -1]
+            cols["next_12m_runrate"][idx] = runrate
+            cols["yoc_initial"][idx] = np.where(init > 0, runrate / init * 100, 0.0)
+            cols["yoc_contrib"][idx] = np.where(contrib > 0, runrate / contrib * 100, 0.0)
+    return {k: np.round(v, 2) for k, v in cols.items()}
+
+
+# === Break-even solver ===
+def payback_weeks_analytic(stock_price, dividend_usd):
+    """Exact payback week under constant price and dividend (array-friendly).
+
+    Reinvesting grows shares by ``1 + r`` a week with ``r = 0.85 * d / p``,
+    and the dividends received after ``n`` weeks add up to
+    ``investment * ((1 + r) ** n - 1)``.  Payback is therefore the first
+    ``n`` with ``(1 + r) ** n >= 2``, whatever the investment or exchange rate.
+    Returns ``inf`` where the dividend is zero.
+    """
+    r = np.asarray(dividend_usd, dtype=float) * NET_OF_TAX / np.asarray(stock_price, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        n = np.ceil(np.log(2.0) / np.log1p(r))
+        # guard the ceil against rounding at exact integers
+        n = np.where((n > 1) & ((1 + r) ** (n - 1) >= 2.0), n - 1, n)
+    return np.where(r > 0, n, np.inf)
+
+
+def _needs_simulation(p: DripParams):
+    if p.g_px or p.g_div or p.extra_invest or p.div_interval != 1:
+        return True
+    if not p.guardrails_on:
+        return False
+    r = p.base_div_usd * NET_OF_TAX / p.price0
+    if p.price_floor_usd is not None and p.price0 < p.price_floor_usd:
+        return True
+    if p.cut_threshold_usd is not None and p.price0 < p.cut_threshold_usd:
+        return True
+    return bool(p.max_shares_growth_y) and (1 + r) ** WEEKS_PER_YEAR > 1 + p.max_shares_growth_y / 100.0
+
+
+def payback_weeks_simulated(params, max_years=MAX_PAYBACK_YEARS):
+    """Payback week for arbitrary :class:`DripParams` (growth, guardrails, ...).
+
+    Cumulative dividends are non-decreasing week over week, so the payback
+    week is found by bisection (``searchsorted``) on the weekly cumulative
+    series; the horizon doubles until every scenario has paid back or
+    ``max_years`` is reached (``inf`` then).
+    """
+    weeks = np.full(len(params), np.inf)
+    todo = list(range(len(params)))
+    years = 10
+    while todo:
+        years = min(years, max_years)
+        out = simulate_drip_batch([replace(params[i], years=years) for i in todo], weekly=True)
+        cum = np.cumsum(out["div_week"], axis=-1)
+        left = []
+        for j, i in enumerate(todo):
+            k = np.searchsorted(cum[j], params[i].init_invest, side="left")
+            if k < cum.shape[1]:
+                weeks[i] = k + 1
+            else:
+                left.append(i)
+        if years >= max_years:
+            break
+        todo, years = left, years * 2
+    return weeks
+
+
+def payback_weeks(params):
+    """Payback week for each :class:`DripParams`: closed form where price and
+    dividend are constant and no guardrail can bind, simulation otherwise."""
+    params = list(params)
+    weeks = np.empty(len(params))
+    needs = np.array([_needs_simulation(p) for p in params], dtype=bool)
+    sim, fast = np.flatnonzero(needs), np.flatnonzero(~needs)
+    if len(fast):
+        weeks[fast] = payback_weeks_analytic([params[i].price0 for i in fast],
+                                             [params[i].base_div_usd for i in fast])
+    if len(sim):
+        weeks[sim] = payback_weeks_simulated([params[i] for i in sim])
+    return weeks
+
+
+def payback_curve(investment=100_000.0, exch=1.0, stock_price=REINVEST_STOCK_PRICE,
+                  dividend_usd=REINVEST_DIVIDEND_USD, **assumptions):
+    """Payback weeks over a range of inputs in one call.
+
+    Any of ``investment``, ``stock_price`` and ``dividend_usd`` may be an
+    array; they broadcast together and the result has their shape.  Extra
+    keyword arguments (``g_px``, ``g_div``, guardrail fields ...) go into
+    :class:`DripParams`; without them the closed form is used directly.
+    """
+    investment, stock_price, dividend_usd = np.broadcast_arrays(
+        *(np.asarray(x, dtype=float) for x in (investment, stock_price, dividend_usd)))
+    if not assumptions:
+        return payback_weeks_analytic(stock_price, dividend_usd)
+    assumptions.setdefault("guardrails_on", False)
+    params = [DripParams(init_invest=inv, price0=px, base_div_usd=d, exch=exch, **assumptions)
+              for inv, px, d in zip(investment.ravel(), stock_price.ravel(), dividend_usd.ravel())]
+    return payback_weeks(params).reshape(investment.shape)
+
+
+def total_received_at(investment, stock_price, dividend_usd, weeks):
+    """Net dividends received after ``weeks`` weeks at constant price/dividend."""
+    r = np.asarray(dividend_usd, dtype=float) * NET_OF_TAX / np.asarray(stock_price, dtype=float)
+    return np.asarray(investment, dtype=float) * ((1 + r) ** np.asarray(weeks, dtype=float) - 1)
@@ -0,0 +1,146 @@
+"""Chart layer for the ULTY web app.
+
+Static charts are drawn on a bare :class:`matplotlib.figure.Figure` (never
+registered with pyplot, so nothing accumulates across reruns), rendered to
+PNG once and kept in a bounded LRU keyed by a hash of the plotted data.  An
+autorefresh rerun with unchanged inputs is a dictionary lookup.
+
+The native option returns small DataFrames for ``st.line_chart`` /
+``st.area_chart``; long series are downsampled to at most ``MAX_POINTS``
+rows, and percentile bands keep their envelope (min of the lower bands,
+max of the upper bands per bucket).
+"""
+import hashlib
+import io
+
+import numpy as np
+
+from ulty_metrics import inc, timer
+from ulty_profile import lazy_import
+from ulty_sim import LRUCache
+
+MAX_POINTS = 300
+CHART_CACHE = LRUCache(maxsize=64)
+
+
+def chart_key(kind, *parts):
+    """Stable hash of a chart kind and the arrays / scalars it plots."""
+    h = hashlib.blake2b(kind.encode(), digest_size=16)
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            a = np.ascontiguousarray(part, dtype=float)
+            h.update(str(a.shape).encode())
+            h.update(a.tobytes())
+        else:
+            h.update(repr(part).encode())
+        h.update(b"|")
+    return h.hexdigest()
+
+
+def _render(kind, key, figsize, draw, cache=CHART_CACHE):
+    png = cache.get(key)
+    inc("ulty_chart_requests_total", kind=kind, result="miss" if png is None else "hit")
+    if png is not None:
+        return png
+    Figure = lazy_import("matplotlib.figure").Figure
+    fig = Figure(figsize=figsize)
+    try:
+        with timer("ulty_chart_render_seconds", kind=kind):
+            draw(fig)
+            buf = io.BytesIO()
+            fig.savefig(buf, format="png", dpi=100, bbox_inches="tight")
+    finally:
+        fig.clear()
+    png = buf.getvalue()
+    cache.put(key, png)
+    return png
+
+
+# === PNG charts ===
+def portfolio_chart_png(years, balance, div_cum, runrate, label_currency):
+    """MODE 4 bar/line chart of the annual results."""
+    def draw(fig):
+        ax = fig.subplots()
+        x = [str(y) for y in years]
+        ax.bar(x, balance, label="Portfolio Value (End of Year)")
+        ax.bar(x, div_cum, label="Cumulative Dividends", alpha=0.5)
+        ax.plot(x, runrate, label="Next 12M Dividend Run-rate", linewidth=2, marker="o")
+        ax.set_ylabel(f"Value ({label_currency})")
+        ax.set_xlabel("Year")
+        ax.set_title("Portfolio Growth with DRIP")
+        ax.legend()
+
+    key = chart_key("portfolio", np.asarray(years), np.asarray(balance), np.asarray(div_cum),
+                    np.asarray(runrate), label_currency)
+    return _render("portfolio", key, (10, 5), draw)
+
+
+def mc_fan_chart_png(years, bands, pct_labels, label_currency):
+    """Monte Carlo fan chart; ``bands`` is the 5-row percentile array."""
+    def draw(fig):
+        ax = fig.subplots()
+        lo, q1, mid, q3, hi = bands
+        ax.fill_between(years, lo, hi, alpha=0.2, label=f"{pct_labels[0]}–{pct_labels[-1]}")
+        ax.fill_between(years, q1, q3, alpha=0.4, label=f"{pct_labels[1]}–{pct_labels[-2]}")
+        ax.plot(years, mid, linewidth=2, label="Median")
+        ax.set_ylabel(f"Value ({label_currency})")
+        ax.set_xlabel("Year")
+        ax.set_title("End-of-Year Balance (Monte Carlo)")
+        ax.legend()
+
+    key = chart_key("mc_fan", np.asarray(years), np.asarray(bands), tuple(pct_labels), label_currency)
+    return _render("mc_fan", key, (10, 5), draw)
+
+
+def sweep_heatmap_png(grid, px_axis, div_axis, metric, years):
+    """Sensitivity grid heatmap (price growth × dividend growth)."""
+    def draw(fig):
+        ax = fig.subplots()
+        im = ax.imshow(grid.T, origin="lower", aspect="auto",
+                       extent=[px_axis[0], px_axis[-1], div_axis[0], div_axis[-1]])
+        fig.colorbar(im, ax=ax, label=metric)
+        ax.set_xlabel("Share Price Growth (%/yr)")
+        ax.set_ylabel("Dividend Growth (%/yr)")
+        ax.set_title(f"{metric} after {years} years")
+
+    key = chart_key("sweep", np.asarray(grid), np.asarray(px_axis), np.asarray(div_axis), metric, years)
+    return _render("sweep", key, (10, 6), draw)
+
+
+# === Native charts ===
+def _buckets(n, max_points):
+    """Bucket start offsets splitting ``n`` points into at most ``max_points`` groups."""
+    if n <= max_points:
+        return None
+    return np.unique(np.linspace(0, n, max_points, endpoint=False).astype(int))
+
+
+def downsample(x, series, max_points=MAX_POINTS, lower=(), upper=()):
+    """Reduce ``x`` and the ``series`` columns to at most ``max_points`` rows.
+
+    Each bucket keeps its last ``x`` and its last value, except columns named
+    in ``lower`` / ``upper``, which keep the bucket minimum / maximum so the
+    band drawn from them still covers every original point.
+    """
+    x = np.asarray(x)
+    starts = _buckets(len(x), max_points)
+    if starts is None:
+        return x, {k: np.asarray(v) for k, v in series.items()}
+    ends = np.append(starts[1:], len(x)) - 1
+    out = {}
+    for name, values in series.items():
+        values = np.asarray(values, dtype=float)
+        if name in lower:
+            out[name] = np.minimum.reduceat(values, starts)
+        elif name in upper:
+            out[name] = np.maximum.reduceat(values, starts)
+        else:
+            out[name] = values[ends]
+    return x[ends], out
+
+
+def native_frame(x, series, index_name, max_points=MAX_POINTS, lower=(), upper=()):
+    """Downsampled ``pandas.DataFrame`` ready for ``st.line_chart``."""
+    pd = lazy_import("pandas")
+    x, cols = downsample(x, series, max_points, lower, upper)
+    return pd.DataFrame(cols, index=pd.Index(x, name=index_name))
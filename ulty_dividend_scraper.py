@@ -1,44 +1,295 @@
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, SoupStrainer
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import argparse
 import datetime
 import json
+import sqlite3
+import sys
+import threading
+import time
+from ulty_metrics import METRICS, count_error, inc, observe, timer
 
-def get_latest_ulty_dividend():
-    url = "https://stockanalysis.com/etf/ulty/dividend/"
-    headers = {
-        "User-Agent": "Mozilla/5.0"
-    }
+STOCKANALYSIS_URL = "https://stockanalysis.com/etf/{ticker}/dividend/"
+DB_PATH = "dividends.sqlite"
+HEADERS = {"User-Agent": "Mozilla/5.0"}
 
-    res = requests.get(url, headers=headers)
-    soup = BeautifulSoup(res.text, "html.parser")
+YIELDMAX_TICKERS = [
+    "ULTY", "YMAX", "YMAG", "TSLY", "OARK", "APLY", "NVDY", "AMZY", "FBY", "GOOY",
+    "CONY", "NFLY", "DISO", "MSFO", "XOMO", "JPMO", "AMDY", "PYPY", "SQY", "MRNY",
+    "AIYY", "MSTY", "YBIT", "GDXY", "SNOY", "ABNY", "BABO", "TSMY", "SMCY", "PLTY",
+    "MARO", "LFGY", "GPTY", "CVNY", "HOOY", "FIAT", "DIPS", "CRSH", "FIVY", "BIGY",
+    "SOXY", "RNTY", "QDTY", "RDTY", "SDTY", "CHPY", "SLTY", "WNTR", "YQQQ",
+]
 
-    table = soup.find("table")
-    rows = table.find_all("tr")[1:]  # Skip header
-    for row in rows:
-        cols = row.find_all("td")
-        if len(cols) >= 3:
-            ex_div_date = cols[0].text.strip()
-            payment_date = cols[1].text.strip()
-            dividend = cols[2].text.strip().replace("$", "")
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dividends (
+    ticker   TEXT NOT NULL,
+    ex_date  TEXT NOT NULL,
+    pay_date TEXT,
+    amount   REAL NOT NULL,
+    PRIMARY KEY (ticker, ex_date)
+);
+CREATE INDEX IF NOT EXISTS idx_dividends_pay ON dividends (ticker, pay_date);
+CREATE TABLE IF NOT EXISTS http_cache (
+    url           TEXT PRIMARY KEY,
+    etag          TEXT,
+    last_modified TEXT,
+    fetched_at    TEXT
+);
+"""
+
+# === ที่เก็บประวัติปันผล (SQLite) ===
+def open_store(path=DB_PATH):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+def _validators(conn, url):
+    row = conn.execute("SELECT etag, last_modified FROM http_cache WHERE url = ?", (url,)).fetchone()
+    return row if row else (None, None)
+
+def _store_validators(conn, url, etag, last_modified):
+    conn.execute(
+        "INSERT OR REPLACE INTO http_cache (url, etag, last_modified, fetched_at) VALUES (?, ?, ?, ?)",
+        (url, etag, last_modified, str(datetime.datetime.now())),
+    )
+
+def conditional_get(session, url, etag=None, last_modified=None, limiter=None):
+    """GET with If-None-Match/If-Modified-Since; returns None on 304."""
+    headers = dict(HEADERS)
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    if limiter is not None:
+        limiter.wait(url)
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        res = session.get(url, headers=headers, timeout=20)
+        if res.status_code == 304:
+            outcome = "not_modified"
+            return None
+        res.raise_for_status()
+        outcome = "ok"
+        return res
+    finally:
+        observe("ulty_fetch_seconds", time.perf_counter() - start, source="stockanalysis", outcome=outcome)
+
+def fetch_if_changed(conn, url, session=requests):
+    """GET ``url`` with the stored ETag/Last-Modified; returns None on 304.
+
+    Nothing is saved here: the caller stores the response validators in the
+    same transaction as the parsed rows, so a failed parse is retried.
+    """
+    return conditional_get(session, url, *_validators(conn, url))
+
+def _parse_date(text):
+    try:
+        return datetime.datetime.strptime(text.strip(), "%b %d, %Y").date().isoformat()
+    except ValueError:
+        return None
 
+def parse_dividend_rows(html):
+    """(ex_date, pay_date, amount) rows of the first table, newest first.
+
+    Only the first ``<table>`` is handed to BeautifulSoup, and only its table
+    tags are built, instead of parsing the whole page.
+    """
+    with timer("ulty_parse_seconds", parser="stockanalysis"):
+        return _parse_first_table(html)
+
+def _parse_first_table(html):
+    start = html.find("<table")
+    end = html.find("</table>", start)
+    if start < 0 or end < 0:
+        return []
+    fragment = html[start:end + len("</table>")]
+    soup = BeautifulSoup(fragment, "html.parser", parse_only=SoupStrainer(["tr", "td"]))
+
+    rows = []
+    for tr in soup.find_all("tr"):
+        cols = tr.find_all("td")
+        if len(cols) >= 3:
+            ex_date = _parse_date(cols[0].text)
             try:
-                # Convert to datetime object
-                pay_date = datetime.datetime.strptime(payment_date, "%b %d, %Y").date()
-                if (datetime.date.today() - pay_date).days <= 14:  # ตรวจสอบว่าข้อมูลใหม่
-                    return float(dividend)
-            except Exception as e:
+                amount = float(cols[2].text.strip().replace("$", "").replace(",", ""))
+            except ValueError:
                 continue
-    return None
+            if ex_date:
+                rows.append((ex_date, _parse_date(cols[1].text), amount))
+    return rows
+
+def _insert_new(conn, ticker, rows):
+    known = {r[0] for r in conn.execute("SELECT ex_date FROM dividends WHERE ticker = ?", (ticker,))}
+    new_rows = [(ticker, ex, pay, amt) for ex, pay, amt in rows if ex not in known]
+    conn.executemany(
+        "INSERT OR IGNORE INTO dividends (ticker, ex_date, pay_date, amount) VALUES (?, ?, ?, ?)",
+        new_rows,
+    )
+    inc("ulty_dividend_rows_inserted_total", len(new_rows), ticker=ticker)
+    return len(new_rows)
+
+def ingest(conn, ticker, rows):
+    """Append rows not yet in the store; returns how many were new."""
+    with conn:
+        return _insert_new(conn, ticker, rows)
+
+def update_history(conn, ticker="ULTY", session=requests):
+    """Fetch the stockanalysis page if it changed and store new rows."""
+    url = STOCKANALYSIS_URL.format(ticker=ticker.lower())
+    res = fetch_if_changed(conn, url, session)
+    if res is None:
+        return 0
+    rows = parse_dividend_rows(res.text)
+    with conn:  # validators only count once the rows are stored
+        n = _insert_new(conn, ticker, rows)
+        _store_validators(conn, url, res.headers.get("ETag"), res.headers.get("Last-Modified"))
+    return n
+
+def load_dividend_history(ticker="ULTY", path=DB_PATH, since=None):
+    """Stored (ex_date, pay_date, amount) rows, oldest first."""
+    conn = open_store(path)
+    try:
+        sql = "SELECT ex_date, pay_date, amount FROM dividends WHERE ticker = ?"
+        args = [ticker]
+        if since:
+            sql += " AND ex_date >= ?"
+            args.append(str(since))
+        return conn.execute(sql + " ORDER BY ex_date", args).fetchall()
+    finally:
+        conn.close()
+
+def latest_recent_dividend(conn, ticker="ULTY", max_age_days=14):
+    cutoff = (datetime.date.today() - datetime.timedelta(days=max_age_days)).isoformat()
+    row = conn.execute(
+        "SELECT amount FROM dividends WHERE ticker = ? AND pay_date >= ? ORDER BY pay_date DESC LIMIT 1",
+        (ticker, cutoff),
+    ).fetchone()
+    return row[0] if row else None
+
+def get_latest_ulty_dividend(path=DB_PATH):
+    conn = open_store(path)
+    try:
+        try:
+            update_history(conn, "ULTY")
+        except requests.RequestException as e:
+            count_error("scrape.ULTY", e)  # ใช้ข้อมูลที่เก็บไว้แล้ว
+        return latest_recent_dividend(conn, "ULTY")  # ตรวจสอบว่าข้อมูลใหม่ (ภายใน 14 วัน)
+    finally:
+        conn.close()
+
+# === Batch mode: หลาย ticker พร้อมกัน ===
+class HostRateLimiter:
+    """Spaces requests to the same host at least ``1 / rate`` seconds apart."""
+
+    def __init__(self, rate=10.0):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next.get(host, now))
+            self._next[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+def make_session(pool_size=16):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def _fetch_and_parse(session, limiter, ticker, url, etag, last_modified):
+    try:
+        res = conditional_get(session, url, etag, last_modified, limiter)
+    except requests.RequestException as e:
+        count_error(f"scrape.{ticker}", e)
+        return ticker, url, None, None, str(e)
+    if res is None:
+        return ticker, url, None, None, None
+    validators = (res.headers.get("ETag"), res.headers.get("Last-Modified"))
+    return ticker, url, validators, parse_dividend_rows(res.text), None
+
+def update_many(conn, tickers, workers=8, rate=10.0, session=None):
+    """Fetch and parse ``tickers`` concurrently, then store everything in one transaction.
+
+    Returns ``{ticker: new_rows}``, with ``0`` for unchanged pages (304) and
+    an error string for failed fetches.
+    """
+    tickers = list(dict.fromkeys(t.upper() for t in tickers))
+    session = session or make_session(pool_size=workers)
+    limiter = HostRateLimiter(rate)
+    jobs = []
+    for ticker in tickers:
+        url = STOCKANALYSIS_URL.format(ticker=ticker.lower())
+        jobs.append((ticker, url) + tuple(_validators(conn, url)))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda job: _fetch_and_parse(session, limiter, *job), jobs))
+
+    summary = {}
+    with conn:  # one atomic bulk write
+        for ticker, url, validators, rows, error in results:
+            if error is not None:
+                summary[ticker] = error
+            elif rows is None:
+                summary[ticker] = 0
+            else:
+                summary[ticker] = _insert_new(conn, ticker, rows)
+                _store_validators(conn, url, *validators)
+    return summary
 
 def save_to_json(dividend):
     with open("latest_dividend.json", "w") as f:
         json.dump({"dividend": dividend, "timestamp": str(datetime.datetime.now())}, f)
 
-if __name__ == "__main__":
-    latest = get_latest_ulty_dividend()
-    if latest:
-        save_to_json(latest)
-        print(f"✅ Updated latest dividend: {latest} USD")
-    else:
-        print("⚠️ Could not fetch dividend.")
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scrape YieldMax ETF dividend history into SQLite.")
+    parser.add_argument("--tickers", help="comma-separated tickers (default: ULTY only)")
+    parser.add_argument("--all", action="store_true", help="scrape the whole YieldMax lineup")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=10.0, help="max requests/second per host")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--metrics", help="write run metrics here (.json for JSON, - for Prometheus text on stdout)")
+    args = parser.parse_args(argv)
+    try:
+        with timer("ulty_scrape_run_seconds", mode="all" if args.all else "tickers" if args.tickers else "latest"):
+            run(args)
+    finally:
+        if args.metrics == "-":
+            sys.stdout.write(METRICS.prometheus())
+        elif args.metrics:
+            METRICS.write(args.metrics)
 
+def run(args):
+    if not args.tickers and not args.all:
+        latest = get_latest_ulty_dividend(args.db)
+        if latest:
+            save_to_json(latest)
+            print(f"✅ Updated latest dividend: {latest} USD")
+        else:
+            print("⚠️ Could not fetch dividend.")
+        return
+
+    tickers = YIELDMAX_TICKERS if args.all else args.tickers.split(",")
+    conn = open_store(args.db)
+    try:
+        summary = update_many(conn, tickers, workers=args.workers, rate=args.rate)
+    finally:
+        conn.close()
+    for ticker, result in summary.items():
+        if isinstance(result, str):
+            print(f"⚠️ {ticker}: {result}")
+        else:
+            print(f"✅ {ticker}: {result} new rows")
+
+if __name__ == "__main__":
+    main()
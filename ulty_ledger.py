@@ -0,0 +1,208 @@
+"""Weekly DRIP ledger for auditing MODE 4 and batch runs.
+
+One row per scenario and week, with typed columns::
+
+    scenario, week, price, dividend_usd, dividend_received,
+    shares_bought, contribution, shares, flags
+
+``dividend_usd`` is the per-share distribution paid that week (after the cut
+guardrail), ``dividend_received`` the net amount in the scenario currency,
+``shares_bought`` the shares bought by reinvesting it and ``shares`` the
+holding at the end of the week (after the year-end growth cap).  ``flags``
+is a bit mask of ``FLAG_*``.
+
+Scenarios are simulated in chunks and appended to Parquet (pyarrow, one row
+group per chunk) or to a raw little-endian record file that
+:func:`open_ledger` maps with ``numpy.memmap``; nothing is held as Python
+objects and memory stays bounded by the chunk size.
+"""
+import io
+import os
+
+import numpy as np
+
+from ulty_profile import lazy_import
+from ulty_sim import WEEKS_PER_YEAR, LRUCache, _schedules, drip_core, price_path
+
+FLAG_PAID = 1          # a distribution was paid this week
+FLAG_PRICE_FLOOR = 2   # price floor guardrail raised the price
+FLAG_DIV_CUT = 4       # price under the cut threshold; dividend reduced
+FLAG_SHARES_CAP = 8    # year-end shares growth cap bound
+
+LEDGER_DTYPE = np.dtype([
+    ("scenario", "<i8"),
+    ("week", "<i4"),
+    ("price", "<f8"),
+    ("dividend_usd", "<f8"),
+    ("dividend_received", "<f8"),
+    ("shares_bought", "<f8"),
+    ("contribution", "<f8"),
+    ("shares", "<f8"),
+    ("flags", "u1"),
+])
+DEFAULT_CHUNK = 256
+LEDGER_CACHE = LRUCache(maxsize=16)  # DripParams -> (columns, download payload)
+
+
+@np.errstate(over="ignore", invalid="ignore")
+def weekly_ledger(ps, scenario_ids=None):
+    """Ledger columns for scenarios sharing one horizon, flattened scenario-major."""
+    total_weeks = int(ps[0].years * WEEKS_PER_YEAR)
+    if any(int(p.years * WEEKS_PER_YEAR) != total_weeks for p in ps):
+        raise ValueError("weekly_ledger needs a single horizon")
+    s = _schedules(ps, total_weeks)
+    out = drip_core(s["px"], s["div"], s["extra"], s["exch"], s["init_shares"], s["cap"], weekly=True)
+    exch = s["exch"][:, None]
+    px = s["px"]
+    shares = out["shares_week"]
+    shares_before = np.concatenate([s["init_shares"][:, None], shares[:, :-1]], axis=-1)
+    bought = out["div_week"] / exch / px
+    contrib_shares = s["extra"] / exch / px
+
+    flags = np.where(s["div"] > 0, FLAG_PAID, 0).astype(np.uint8)
+    floor = np.array([p.price_floor_usd if p.guardrails_on and p.price_floor_usd is not None
+                      else -np.inf for p in ps])
+    raw_px = price_path([p.price0 for p in ps], [p.g_px for p in ps], total_weeks)
+    flags |= np.where(raw_px < floor[:, None], FLAG_PRICE_FLOOR, 0).astype(np.uint8)
+    cut_at = np.array([p.cut_threshold_usd if p.guardrails_on and p.cut_threshold_usd is not None
+                       and p.cut_percent else -np.inf for p in ps])
+    flags |= np.where(px < cut_at[:, None], FLAG_DIV_CUT, 0).astype(np.uint8)
+    uncapped = shares_before + bought + contrib_shares
+    year_end = np.arange(1, total_weeks + 1) % WEEKS_PER_YEAR == 0
+    capped = year_end & (shares < uncapped * (1 - 1e-12))
+    flags |= np.where(capped, FLAG_SHARES_CAP, 0).astype(np.uint8)
+
+    n = len(ps)
+    ids = np.arange(n) if scenario_ids is None else np.asarray(scenario_ids)
+    return {
+        "scenario": np.repeat(ids.astype(np.int64), total_weeks),
+        "week": np.tile(np.arange(1, total_weeks + 1, dtype=np.int32), n),
+        "price": px.ravel(),
+        "dividend_usd": np.broadcast_to(s["div"], px.shape).ravel(),
+        "dividend_received": out["div_week"].ravel(),
+        "shares_bought": bought.ravel(),
+        "contribution": np.broadcast_to(s["extra"], px.shape).ravel(),
+        "shares": shares.ravel(),
+        "flags": flags.ravel(),
+    }
+
+
+def _format_for(path):
+    return "parquet" if str(path).endswith(".parquet") else "raw"
+
+
+class LedgerWriter:
+    """Append ledger chunks to ``path`` (``.parquet`` or a raw record file).
+
+    ``write`` takes any number of :class:`ulty_sim.DripParams`, groups them
+    by horizon and simulates ``chunk`` scenarios at a time.  Scenario ids
+    continue across calls unless passed explicitly.
+    """
+
+    def __init__(self, path, fmt=None, chunk=DEFAULT_CHUNK):
+        self.path = path
+        self.fmt = fmt or _format_for(path)
+        self.chunk = chunk
+        self.rows = 0
+        self._next_id = 0
+        self._pq = None
+        if self.fmt == "parquet":
+            self._pa = lazy_import("pyarrow")
+            self._pq = lazy_import("pyarrow.parquet")
+            self._schema = self._pa.schema([(name, self._pa.from_numpy_dtype(LEDGER_DTYPE[name]))
+                                            for name in LEDGER_DTYPE.names])
+            self._writer = self._pq.ParquetWriter(path, self._schema)
+        else:
+            self._fh = open(path, "wb") if isinstance(path, (str, os.PathLike)) else path
+
+    def write(self, ps, scenario_ids=None):
+        ps = list(ps)
+        if scenario_ids is None:
+            ids = np.arange(self._next_id, self._next_id + len(ps))
+            self._next_id += len(ps)
+        else:
+            ids = np.asarray(scenario_ids)
+        by_years = {}
+        for i, p in enumerate(ps):
+            by_years.setdefault(p.years, []).append(i)
+        for idx in by_years.values():
+            for lo in range(0, len(idx), self.chunk):
+                part = idx[lo:lo + self.chunk]
+                self._append(weekly_ledger([ps[i] for i in part], ids[part]))
+
+    def _append(self, cols):
+        if self._pq is not None:
+            self._writer.write_table(self._pa.table(cols, schema=self._schema))
+        else:
+            rec = np.empty(len(cols["week"]), dtype=LEDGER_DTYPE)
+            for name in LEDGER_DTYPE.names:
+                rec[name] = cols[name]
+            self._fh.write(rec.tobytes())
+        self.rows += len(cols["week"])
+
+    def close(self):
+        if self._pq is not None:
+            self._writer.close()
+        elif self._fh is not self.path:
+            self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_ledger(ps, path, fmt=None, chunk=DEFAULT_CHUNK):
+    """Write the ledger of ``ps`` to ``path``; returns the row count."""
+    with LedgerWriter(path, fmt, chunk) as writer:
+        writer.write(ps)
+    return writer.rows
+
+
+def open_ledger(path):
+    """Read a ledger back: a pyarrow Table for Parquet, a read-only memmap otherwise."""
+    if _format_for(path) == "parquet":
+        return lazy_import("pyarrow.parquet").read_table(path)
+    return np.memmap(path, dtype=LEDGER_DTYPE, mode="r")
+
+
+def parquet_available():
+    try:
+        lazy_import("pyarrow.parquet")
+    except ImportError:
+        return False
+    return True
+
+
+def _download(fill):
+    """``(data, file_name, mime)`` for a download button: Parquet if pyarrow is
+    installed, otherwise a ``.npy`` file of ``LEDGER_DTYPE`` records.
+    ``fill(writer)`` writes the rows to an in-memory :class:`LedgerWriter`."""
+    if parquet_available():
+        buf = io.BytesIO()
+        with LedgerWriter(buf, "parquet") as writer:
+            fill(writer)
+        return buf.getvalue(), "ulty_ledger.parquet", "application/vnd.apache.parquet"
+    raw = io.BytesIO()
+    with LedgerWriter(raw, "raw") as writer:
+        fill(writer)
+    buf = io.BytesIO()
+    np.save(buf, np.frombuffer(raw.getbuffer(), dtype=LEDGER_DTYPE))
+    return buf.getvalue(), "ulty_ledger.npy", "application/octet-stream"
+
+
+def ledger_bytes(ps):
+    """Download payload (see :func:`_download`) of the ledger of ``ps``."""
+    return _download(lambda writer: writer.write(ps))
+
+
+def ledger_download(p, cache=LEDGER_CACHE):
+    """``(columns, (data, file_name, mime))`` for one scenario, simulated and
+    encoded once per :class:`ulty_sim.DripParams` so reruns reuse both."""
+    hit = cache.get(p)
+    if hit is None:
+        cols = weekly_ledger([p])
+        hit = (cols, _download(lambda writer: writer._append(cols)))
+        cache.put(p, hit)
+    return hit
@@ -0,0 +1,418 @@
+"""Market data for the ULTY calculator: price, USD/THB rate and latest dividend.
+
+All HTTP goes through one pooled ``requests.Session``; the three sources are
+fetched concurrently on a shared thread pool with per-source timeouts, and
+every good result is kept in a process-wide cache.  A single background
+refresher thread per process keeps that cache warm, so sessions read the
+last-good values instantly (stale-while-revalidate) and upstream traffic does
+not grow with the number of open tabs.
+"""
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from io import StringIO
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ulty_metrics import count_error, inc, observe, timer
+from ulty_profile import lazy_import
+
+ULTY_TICKER = "ULTY"
+USER_AGENT = "Mozilla/5.0"
+
+# source -> (timeout seconds, TTL seconds for a good value, TTL after a failure)
+SOURCE_SETTINGS = {
+    "price": (10.0, 5 * 60, 60),
+    "fx": (5.0, 60 * 60, 60),
+    "dividend": (20.0, 60 * 60, 5 * 60),
+}
+
+
+def _make_session():
+    s = requests.Session()
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    s.headers.update({"User-Agent": USER_AGENT})
+    return s
+
+
+SESSION = _make_session()
+_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="ulty-market")
+
+
+class TTLCache:
+    """Thread-safe ``key -> (value, fetched_at)`` store with per-lookup TTL."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, ttl):
+        with self._lock:
+            entry = self._data.get(key)
+        if entry is None or time.time() - entry[1] > ttl:
+            return False, None
+        return True, entry[0]
+
+    def peek(self, key, default=None):
+        """Last stored value regardless of age."""
+        with self._lock:
+            entry = self._data.get(key)
+        return default if entry is None else entry[0]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.time())
+
+    def age(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+        return None if entry is None else time.time() - entry[1]
+
+    def clear(self, source=None):
+        with self._lock:
+            if source is None:
+                self._data.clear()
+            else:
+                for key in [k for k in self._data if k[0] == source]:
+                    del self._data[key]
+
+
+CACHE = TTLCache()
+
+
+# === Fetchers ===
+def get_stock_price(ticker=ULTY_TICKER, timeout=10.0):
+    yf = lazy_import("yfinance")
+    hist = yf.Ticker(ticker).history(period="1d", timeout=timeout)
+    if not hist.empty:
+        return round(float(hist["Close"].iloc[-1]), 2)
+    return None
+
+
+def get_exchange_rate(base="USD", quote="THB", timeout=5.0):
+    try:
+        res = SESSION.get(f"https://api.frankfurter.app/latest?from={base}&to={quote}", timeout=timeout)
+        data = res.json()
+        return round(data["rates"][quote], 2)
+    except Exception as e:
+        count_error("fx", e)
+        return None
+
+
+# --- Dividend sources ---
+def _dividend_from_yfinance(ticker, timeout):
+    yf = lazy_import("yfinance")
+    s = yf.Ticker(ticker).history(period="1y", timeout=timeout)["Dividends"]
+    s = s[s > 0]
+    if len(s) > 0:
+        return float(s.iloc[-1]), s.index[-1].to_pydatetime()
+    return None, None
+
+
+def _dividend_from_yieldmax(ticker, timeout):
+    url = f"https://yieldmaxetfs.com/{ticker.lower()}"
+    pd = lazy_import("pandas")
+    html = SESSION.get(url, timeout=timeout).text
+    with timer("ulty_parse_seconds", parser="read_html"):
+        tables = pd.read_html(StringIO(html))
+    for df in tables:
+        cols = [str(c).lower() for c in df.columns]
+        if any(k in ''.join(cols) for k in ["amount", "distribution", "dividend"]):
+            for c in df.columns:
+                if any(k in str(c).lower() for k in ["amount", "distribution", "dividend"]):
+                    series = (
+                        df[c].astype(str)
+                        .str.replace("$", "", regex=False)
+                        .str.replace(",", "", regex=False)
+                        .str.extract(r"([0-9]*\.?[0-9]+)")[0]
+                        .astype(float)
+                        .dropna()
+                    )
+                    if len(series) > 0:
+                        return float(series.iloc[0]), None
+    return None, None
+
+
+def _dividend_from_nasdaq(ticker, timeout):
+    url = f"https://api.nasdaq.com/api/quote/{ticker}/dividends?assetclass=etf"
+    js = SESSION.get(url, timeout=timeout).json()
+    rows = js.get("data", {}).get("dividends", {}).get("rows", [])
+    if rows:
+        amt_str = rows[0].get("cashAmount") or rows[0].get("amount") or ""
+        amt = float(str(amt_str).replace("$", "").replace(",", ""))
+        if amt > 0:
+            return amt, None
+    return None, None
+
+
+class CircuitBreaker:
+    """Per-source failure/latency tracker.
+
+    After ``failure_threshold`` consecutive failures the breaker opens and the
+    source is skipped for ``cooldown`` seconds; then one trial call is let
+    through (half-open) and its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, name, failure_threshold=3, cooldown=300.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.calls = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.latency_ewma = None
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.time() - self.opened_at >= self.cooldown:
+                self.opened_at = time.time()  # half-open: admit one trial
+                return True
+            return False
+
+    def record(self, ok, latency):
+        with self._lock:
+            self.calls += 1
+            self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+            if ok:
+                self.consecutive_failures = 0
+                self.opened_at = None
+            else:
+                self.failures += 1
+                self.consecutive_failures += 1
+                if self.consecutive_failures >= self.failure_threshold:
+                    self.opened_at = time.time()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "source": self.name,
+                "calls": self.calls,
+                "failure_rate": self.failures / self.calls if self.calls else 0.0,
+                "latency_ewma_s": self.latency_ewma,
+                "open": self.opened_at is not None,
+            }
+
+
+DIVIDEND_SOURCES = [
+    (CircuitBreaker("yfinance"), _dividend_from_yfinance),
+    (CircuitBreaker("yieldmaxetfs"), _dividend_from_yieldmax),
+    (CircuitBreaker("nasdaq"), _dividend_from_nasdaq),
+]
+HEDGE_DELAY = 1.5
+# separate pool: dividend refreshes already run on _EXECUTOR and wait on these
+_HEDGE_EXECUTOR = ThreadPoolExecutor(max_workers=6, thread_name_prefix="ulty-hedge")
+
+
+def _call_source(breaker, fn, ticker, timeout):
+    start = time.monotonic()
+    try:
+        amt, date = fn(ticker, timeout)
+        ok = amt is not None and amt > 0
+        outcome = "ok" if ok else "empty"
+    except Exception as e:
+        count_error(f"dividend.{breaker.name}", e)
+        amt, date, ok, outcome = None, None, False, "error"
+    elapsed = time.monotonic() - start
+    breaker.record(ok, elapsed)
+    observe("ulty_dividend_source_seconds", elapsed, source=breaker.name, outcome=outcome)
+    return (amt, date) if ok else None
+
+
+def first_valid(sources, ticker, timeout=20.0, hedge_delay=HEDGE_DELAY):
+    """Race ``sources`` in priority order, starting the next one after
+    ``hedge_delay`` seconds (or as soon as a running one fails), and return the
+    first valid ``(amount, date)``.  Sources with an open breaker are skipped.
+    """
+    queue = list(sources)
+    running = set()
+    deadline = time.monotonic() + timeout
+    while queue or running:
+        if queue:  # first pass, hedge delay elapsed, or a running source failed
+            b, fn = queue.pop(0)
+            if not b.allow():  # asked only at launch, so an unused half-open trial is kept
+                continue
+            running.add(_HEDGE_EXECUTOR.submit(_call_source, b, fn, ticker, timeout))
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        done, running = wait(running, timeout=min(hedge_delay, remaining) if queue else remaining,
+                             return_when=FIRST_COMPLETED)
+        for fut in done:
+            if fut.result() is not None:
+                return fut.result()
+    return None
+
+
+def fetch_latest_weekly_dividend_usd(ticker: str = ULTY_TICKER, timeout=20.0):
+    """Latest per-period distribution as ``(amount, date)``; ``(None, None)`` if unknown.
+
+    yfinance, the YieldMax fund page and the Nasdaq API are raced with a
+    hedge delay (see :func:`first_valid`).
+    """
+    return first_valid(DIVIDEND_SOURCES, ticker, timeout) or (None, None)
+
+
+def dividend_source_stats():
+    return [b.stats() for b, _ in DIVIDEND_SOURCES]
+
+
+_FETCHERS = {
+    "price": lambda ticker, timeout: get_stock_price(ticker, timeout=timeout),
+    "fx": lambda ticker, timeout: get_exchange_rate(timeout=timeout),
+    "dividend": lambda ticker, timeout: fetch_latest_weekly_dividend_usd(ticker, timeout=timeout),
+}
+_EMPTY = {"price": None, "fx": None, "dividend": (None, None)}
+
+
+def _is_good(source, value):
+    return value[0] is not None if source == "dividend" else value is not None
+
+
+@dataclass(frozen=True)
+class MarketData:
+    price: float | None
+    exchange_rate: float | None
+    dividend: float | None
+    dividend_date: object = None
+    ages: dict | None = None  # source -> seconds since the value was fetched
+
+
+_INFLIGHT = {}
+_LAST_FAILURE = {}
+FETCH_TIMINGS = {}  # (source, ticker) -> (seconds, ok, finished_at) of the last fetch
+_STATE_LOCK = threading.Lock()
+
+
+def _refresh(source, ticker):
+    key = (source, ticker)
+    start = time.perf_counter()
+    try:
+        value = _FETCHERS[source](ticker, SOURCE_SETTINGS[source][0])
+    except Exception as e:
+        count_error(f"fetch.{source}", e)
+        value = _EMPTY[source]
+    elapsed, ok = time.perf_counter() - start, _is_good(source, value)
+    FETCH_TIMINGS[key] = (elapsed, ok, time.time())
+    observe("ulty_fetch_seconds", elapsed, source=source, outcome="ok" if ok else "failed")
+    with _STATE_LOCK:
+        if _is_good(source, value):
+            CACHE.put(key, value)
+            _LAST_FAILURE.pop(key, None)
+        else:
+            _LAST_FAILURE[key] = time.time()  # keep serving the last good value
+        _INFLIGHT.pop(key, None)
+    return value
+
+
+def _submit(source, ticker):
+    """Start a refresh unless one is already running for the same key."""
+    key = (source, ticker)
+    with _STATE_LOCK:
+        fut = _INFLIGHT.get(key)
+        if fut is None:
+            fut = _INFLIGHT[key] = _EXECUTOR.submit(_refresh, source, ticker)
+    return fut
+
+
+def _is_due(source, ticker):
+    _, ttl_ok, ttl_fail = SOURCE_SETTINGS[source]
+    key = (source, ticker)
+    if CACHE.get(key, ttl_ok)[0]:
+        return False
+    failed_at = _LAST_FAILURE.get(key)
+    return failed_at is None or time.time() - failed_at > ttl_fail
+
+
+def _is_cold(source, ticker):
+    key = (source, ticker)
+    return CACHE.age(key) is None and key not in _LAST_FAILURE
+
+
+def _snapshot(ticker):
+    values = {src: CACHE.peek((src, ticker), _EMPTY[src]) for src in SOURCE_SETTINGS}
+    ages = {src: CACHE.age((src, ticker)) for src in SOURCE_SETTINGS}
+    div_amt, div_date = values["dividend"]
+    return MarketData(values["price"], values["fx"], div_amt, div_date, ages)
+
+
+def invalidate(source=None):
+    """Drop cached values (all or one source) so the next read refetches."""
+    CACHE.clear(source)
+    with _STATE_LOCK:
+        for key in [k for k in _LAST_FAILURE if source is None or k[0] == source]:
+            del _LAST_FAILURE[key]
+
+
+def fetch_market_data(ticker=ULTY_TICKER):
+    """Price, FX and dividend, refreshing expired sources in parallel and waiting for them."""
+    pending = {src: _submit(src, ticker) for src in SOURCE_SETTINGS if _is_due(src, ticker)}
+    start = time.monotonic()
+    for source, fut in pending.items():
+        timeout = SOURCE_SETTINGS[source][0]
+        try:
+            fut.result(timeout=max(0.0, timeout - (time.monotonic() - start)))
+        except TimeoutError:  # the refresh finishes in the background
+            inc("ulty_fetch_timeouts_total", source=source)
+    return _snapshot(ticker)
+
+
+# === Background refresher (one per server process) ===
+class MarketRefresher(threading.Thread):
+    """Daemon thread that re-fetches due sources for every registered ticker."""
+
+    def __init__(self, interval=30.0):
+        super().__init__(name="ulty-market-refresher", daemon=True)
+        self.interval = interval
+        self.tickers = set()
+        self._wake = threading.Event()
+
+    def add(self, ticker):
+        if ticker not in self.tickers:
+            self.tickers.add(ticker)
+            self._wake.set()
+
+    def run(self):
+        while True:
+            for ticker in list(self.tickers):
+                for source in SOURCE_SETTINGS:
+                    if _is_due(source, ticker):
+                        _submit(source, ticker)
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+
+_REFRESHER = None
+_REFRESHER_LOCK = threading.Lock()
+
+
+def ensure_refresher(ticker=ULTY_TICKER, interval=30.0):
+    global _REFRESHER
+    with _REFRESHER_LOCK:
+        if _REFRESHER is None:
+            _REFRESHER = MarketRefresher(interval)
+            _REFRESHER.start()
+        _REFRESHER.add(ticker)
+    return _REFRESHER
+
+
+def get_market_data(ticker=ULTY_TICKER):
+    """Instant read from the shared store; only blocks on a cold start."""
+    ensure_refresher(ticker)
+    if any(_is_cold(src, ticker) for src in SOURCE_SETTINGS):
+        for source in SOURCE_SETTINGS:
+            inc("ulty_cache_requests_total", source=source, result="miss")
+        return fetch_market_data(ticker)
+    for source in SOURCE_SETTINGS:
+        due = _is_due(source, ticker)
+        inc("ulty_cache_requests_total", source=source, result="stale" if due else "hit")
+        if due:
+            _submit(source, ticker)  # revalidate now, serve stale meanwhile
+    return _snapshot(ticker)
@@ -0,0 +1,196 @@
+"""Process-wide counters and latency histograms for the app, engine and scraper.
+
+Hot paths record into :data:`METRICS`::
+
+    with timer("ulty_fetch_seconds", source="fx"):
+        ...
+    inc("ulty_cache_requests_total", source="fx", result="hit")
+
+and the registry exports Prometheus text (:meth:`Metrics.prometheus`, also
+served on ``/metrics`` by :func:`serve`) or a JSON snapshot
+(:meth:`Metrics.snapshot`, :meth:`Metrics.log_json`).  Only the standard
+library is used, so importing this module costs nothing.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+log = logging.getLogger("ulty.metrics")
+
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _labels(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join('%s="%s"' % (k, v.replace("\\", "\\\\").replace('"', '\\"')) for k, v in items) + "}"
+
+
+class Metrics:
+    """Thread-safe registry of counters and fixed-bucket histograms."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counters = {}    # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [bucket counts, count, sum, max]
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            h = self._histograms.get(key)
+            if h is None:
+                h = self._histograms[key] = [[0] * len(self.buckets), 0, 0.0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    h[0][i] += 1
+            h[1] += 1
+            h[2] += seconds
+            h[3] = max(h[3], seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Time the block; the ``outcome`` label is ``error`` if it raised."""
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            yield
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start, outcome=outcome, **labels)
+
+    def timed(self, name, **labels):
+        """Decorator form of :meth:`timer`."""
+        def decorate(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def value(self, name, **labels):
+        """Current counter value (0 if never incremented)."""
+        with self._lock:
+            return self._counters.get((name, _labels(labels)), 0)
+
+    def snapshot(self):
+        with self._lock:
+            counters = [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(self._counters.items())]
+            histograms = [{"name": n, "labels": dict(l), "count": h[1], "sum": h[2], "max": h[3]}
+                          for (n, l), h in sorted(self._histograms.items())]
+        return {"time": time.time(), "counters": counters, "histograms": histograms}
+
+    def prometheus(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((k, ([*h[0]], h[1], h[2])) for k, h in self._histograms.items())
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{_fmt_labels(labels)} {value}")
+        for (name, labels), (buckets, count, total) in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            for bound, n in zip(self.buckets, buckets):
+                lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', repr(bound))])} {n}")
+            lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', '+Inf')])} {count}")
+            lines.append(f"{name}_sum{_fmt_labels(labels)} {total}")
+            lines.append(f"{name}_count{_fmt_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def log_json(self, logger=log, level=logging.INFO):
+        logger.log(level, json.dumps(self.snapshot()))
+
+    def write(self, path):
+        """Write a snapshot to ``path`` (``.json`` for JSON, otherwise Prometheus text)."""
+        text = json.dumps(self.snapshot(), indent=2) if str(path).endswith(".json") else self.prometheus()
+        with open(path, "w") as f:
+            f.write(text)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+METRICS = Metrics()
+inc = METRICS.inc
+observe = METRICS.observe
+timer = METRICS.timer
+timed = METRICS.timed
+
+
+def count_error(where, exc, logger=log):
+    """Log a swallowed exception and count it as ``ulty_errors_total``."""
+    METRICS.inc("ulty_errors_total", where=where, error=type(exc).__name__)
+    logger.warning("%s failed: %s: %s", where, type(exc).__name__, exc)
+
+
+# === /metrics endpoint ===
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = METRICS
+
+    def do_GET(self):
+        if self.path.startswith("/metrics.json"):
+            body, ctype = json.dumps(self.registry.snapshot()).encode(), "application/json"
+        elif self.path.startswith("/metrics"):
+            body, ctype = self.registry.prometheus().encode(), "text/plain; version=0.0.4"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+_SERVER = None
+_SERVER_LOCK = threading.Lock()
+
+
+def serve(port, host="127.0.0.1"):
+    """Serve ``/metrics`` and ``/metrics.json`` from a daemon thread (once per process)."""
+    global _SERVER
+    with _SERVER_LOCK:
+        if _SERVER is None:
+            _SERVER = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_SERVER.serve_forever, name="ulty-metrics", daemon=True).start()
+    return _SERVER
+
+
+def serve_from_env(var="ULTY_METRICS_PORT"):
+    """Start :func:`serve` when ``$ULTY_METRICS_PORT`` is set."""
+    port = os.environ.get(var)
+    if port:
+        try:
+            return serve(int(port), os.environ.get("ULTY_METRICS_HOST", "127.0.0.1"))
+        except (OSError, ValueError) as e:
+            count_error("metrics.serve", e)
+    return None
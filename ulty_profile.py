@@ -0,0 +1,54 @@
+"""Startup / rerun profiling for the ULTY web app.
+
+``lazy_import`` loads heavy libraries on first use and records how long the
+import took (once per process).  ``RerunProfile`` times named spans of a
+single Streamlit rerun.  Fetch durations come from ``ulty_market.FETCH_TIMINGS``.
+"""
+import importlib
+import sys
+import time
+from contextlib import contextmanager
+
+PROCESS_START = time.perf_counter()
+IMPORT_TIMES = {}
+
+
+def lazy_import(name):
+    """``importlib.import_module`` that records the first (cold) import time.
+
+    The import always goes through ``importlib`` (which waits on the module
+    lock), so a thread never gets a module another thread is still importing.
+    """
+    cold = name not in sys.modules
+    start = time.perf_counter()
+    mod = importlib.import_module(name)
+    if cold:
+        IMPORT_TIMES.setdefault(name, time.perf_counter() - start)
+    return mod
+
+
+class RerunProfile:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans = []
+
+    @contextmanager
+    def span(self, label):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append((label, time.perf_counter() - t0))
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def rows(self, fetch_timings=None):
+        """Flat ``[{"kind", "name", "seconds"}]`` list for display."""
+        rows = [{"kind": "import", "name": k, "seconds": v} for k, v in IMPORT_TIMES.items()]
+        rows += [{"kind": "rerun", "name": k, "seconds": v} for k, v in self.spans]
+        for (source, ticker), (seconds, ok, _) in (fetch_timings or {}).items():
+            rows.append({"kind": "fetch", "name": f"{source}:{ticker}" + ("" if ok else " (failed)"),
+                         "seconds": seconds})
+        rows.append({"kind": "rerun", "name": "total so far", "seconds": self.elapsed()})
+        return rows
@@ -0,0 +1,567 @@
+"""Vectorized DRIP simulation engine used by MODE 4 of ``ulty_webapp.py``.
+
+The weekly loop is expressed as a linear recurrence on the share count::
+
+    shares[w] = a[w] * shares[w-1] + b[w]
+
+where ``a`` carries the reinvested dividend and ``b`` the extra contribution.
+Inside a year nothing is clipped, so the whole year collapses into two
+coefficients computed with ``cumprod``/``cumsum``.  Only the year-end shares
+growth cap is non-linear, and that is applied once per year across every
+scenario at the same time.  All inputs broadcast, so one call can simulate a
+single path or a whole batch of scenarios.
+"""
+import itertools
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+
+import numpy as np
+
+from ulty_metrics import inc, timed
+
+WEEKS_PER_YEAR = 52
+NET_OF_TAX = 0.85  # ภาษีหัก ณ ที่จ่าย 15%
+FREQ_TO_WEEKS = {"Weekly": 1, "Monthly": 4, "Quarterly": 13}
+
+# Reality guardrail defaults (MODE 4 page, batch runner, backtest)
+PRICE_FLOOR_USD = 0.50
+CUT_THRESHOLD_USD = 1.00
+CUT_PERCENT = 50.0
+MAX_SHARES_GROWTH_Y = 300.0
+
+
+@dataclass(frozen=True)
+class DripParams:
+    init_invest: float
+    price0: float
+    base_div_usd: float
+    years: int = 10
+    exch: float = 1.0
+    g_px: float = 0.0
+    g_div: float = 0.0
+    div_interval: int = 1
+    extra_invest: float = 0.0
+    extra_interval: int = 1
+    guardrails_on: bool = True
+    price_floor_usd: float | None = PRICE_FLOOR_USD
+    cut_threshold_usd: float | None = CUT_THRESHOLD_USD
+    cut_percent: float = CUT_PERCENT
+    max_shares_growth_y: float = MAX_SHARES_GROWTH_Y
+
+
+def _col(x):
+    # scalar or (B,) parameter -> broadcastable against (..., weeks)
+    return np.asarray(x, dtype=float)[..., None]
+
+
+def week_index(total_weeks, start_week=0):
+    # 1-based week numbers after the first ``start_week`` weeks
+    return np.arange(start_week + 1, total_weeks + 1)
+
+
+def price_path(price0, g_px, total_weeks, price_floor_usd=None, start_week=0):
+    """Weekly-compounded price path with the optional price floor applied.
+
+    ``start_week`` skips that many leading weeks (the result covers weeks
+    ``start_week + 1 .. total_weeks``).
+    """
+    weeks = week_index(total_weeks, start_week)
+    px = _col(price0) * (1.0 + _col(g_px)) ** (weeks / float(WEEKS_PER_YEAR))
+    if price_floor_usd is not None:
+        floor = _col(price_floor_usd)
+        px = np.where(px < floor, floor, px)
+    return px
+
+
+def dividend_levels(base_div_usd, g_div, n_years, first_year=0):
+    """Dividend per period for year first_year..n_years-1 (step-yearly growth)."""
+    years = np.arange(first_year, n_years)
+    return _col(base_div_usd) * (1.0 + _col(g_div)) ** years
+
+
+def dividend_schedule(levels, px, div_interval=1, cut_threshold_usd=None, cut_percent=0.0, start_week=0):
+    """Expand yearly dividend levels to the USD dividend paid each week.
+
+    Weeks between payments are zero and the cut guardrail is applied where
+    the price sits under the threshold.  ``px`` and ``levels`` start at
+    ``start_week`` (a year boundary).
+    """
+    n_weeks = px.shape[-1]
+    weeks = week_index(start_week + n_weeks, start_week)
+    div = np.repeat(levels, WEEKS_PER_YEAR, axis=-1)[..., :n_weeks]
+    if cut_threshold_usd is not None:
+        cut = px < _col(cut_threshold_usd)
+        div = np.where(cut, div * (1 - (_col(cut_percent) / 100.0)), div)
+    paid = (weeks % _col(div_interval) == 0) & (div > 0)
+    return np.where(paid, div, 0.0)
+
+
+def contribution_schedule(extra_invest, extra_interval, total_weeks, start_week=0):
+    weeks = week_index(total_weeks, start_week)
+    extra = _col(extra_invest)
+    return np.where(weeks % _col(extra_interval) == 0, extra, 0.0)
+
+
+def cap_multiplier(guardrails_on, max_shares_growth_y):
+    """Year-end shares cap as a multiplier of year-start shares (inf = off)."""
+    cap = np.asarray(max_shares_growth_y, dtype=float)
+    on = np.asarray(guardrails_on, dtype=bool) & (cap > 0)
+    return np.where(on, 1.0 + cap / 100.0, np.inf)
+
+
+# uncapped DRIP can legitimately overflow to inf over long horizons
+@np.errstate(over="ignore", invalid="ignore")
+def drip_core(px, div_usd, extra, exch, init_shares, cap=np.inf, weekly=False):
+    """Run the DRIP recurrence over whole years.
+
+    ``px``, ``div_usd`` and ``extra`` are ``(..., weeks)`` arrays with
+    ``weeks`` a multiple of 52; ``exch``, ``init_shares`` and ``cap`` broadcast
+    against the leading dimensions.  Returns yearly ``(..., years)`` arrays,
+    plus ``(..., weeks)`` ``div_week``/``shares_week`` when ``weekly`` is set.
+    """
+    px, div_usd, extra = np.broadcast_arrays(px, div_usd, extra)
+    lead = px.shape[:-1]
+    n_years = px.shape[-1] // WEEKS_PER_YEAR
+    shape = lead + (n_years, WEEKS_PER_YEAR)
+    px = px.reshape(shape)
+    div_usd = div_usd.reshape(shape)
+    extra = extra.reshape(shape)
+    exch_y = np.asarray(exch, dtype=float)[..., None, None]
+
+    div_ccy = div_usd * (exch_y * NET_OF_TAX)    # net dividend per share held
+    a = div_usd * NET_OF_TAX                     # DRIP growth factor
+    a /= px
+    a += 1.0
+
+    # Within-year closed form: shares[k] = A[k] * s0 + B[k].  Dividends are
+    # paid on the shares held before week k, i.e. A[k-1] * s0 + B[k-1].
+    A_prev = np.empty(shape)
+    A_prev[..., 0] = 1.0
+    np.cumprod(a[..., :-1], axis=-1, out=A_prev[..., 1:])
+    A_end = A_prev[..., -1] * a[..., -1]
+    D1 = np.einsum("...k,...k->...", div_ccy, A_prev)
+    if extra.any():
+        b = extra / exch_y / px                  # shares bought with extra cash
+        b /= A_prev
+        b /= a
+        B = np.cumsum(b, axis=-1)
+        B *= A_prev
+        B *= a
+        B_end = B[..., -1]
+        D2 = np.einsum("...k,...k->...", div_ccy[..., 1:], B[..., :-1])
+    else:
+        B = None
+        B_end = D2 = np.zeros(shape[:-1])
+
+    shares_end = np.empty(lead + (n_years,))
+    shares_start = np.empty(lead + (n_years,))
+    div_year = np.empty(lead + (n_years,))
+    s = np.broadcast_to(np.asarray(init_shares, dtype=float), lead).astype(float)
+    cap = np.broadcast_to(np.asarray(cap, dtype=float), lead)
+    cap_on = np.isfinite(cap)
+    cap = np.where(cap_on, cap, 1.0)
+    for y in range(n_years):
+        shares_start[..., y] = s
+        div_year[..., y] = s * D1[..., y] + D2[..., y]
+        nxt = A_end[..., y] * s + B_end[..., y]
+        s = np.where(cap_on, np.minimum(nxt, s * cap), nxt)
+        shares_end[..., y] = s
+
+    out = {
+        "shares_end": shares_end,
+        "px_end": px[..., -1],
+        "div_year": div_year,
+        "div_cum": np.cumsum(div_year, axis=-1),
+        "contrib_year": extra.sum(axis=-1),
+    }
+    if weekly:
+        held = A_prev * shares_start[..., None]         # shares before each week
+        if B is not None:
+            held[..., 1:] += B[..., :-1]
+        shares_week = A_prev * a * shares_start[..., None]
+        if B is not None:
+            shares_week += B
+        shares_week[..., -1] = shares_end                # year-end cap
+        out["div_week"] = (div_ccy * held).reshape(lead + (-1,))
+        out["shares_week"] = shares_week.reshape(lead + (-1,))
+    return out
+
+
+def _field(ps, name):
+    return np.array([getattr(p, name) for p in ps], dtype=float)
+
+
+def _scenario_inputs(ps, n_years, first_year=0):
+    """Per-scenario scalars and the dividend levels of years first_year..n_years."""
+    return {
+        "levels": dividend_levels(_field(ps, "base_div_usd"), _field(ps, "g_div"), n_years + 1, first_year),
+        "exch": _field(ps, "exch"),
+        "init_invest": _field(ps, "init_invest"),
+        "periods": np.floor(WEEKS_PER_YEAR / _field(ps, "div_interval")),
+    }
+
+
+def _schedules(ps, total_weeks, start_week=0):
+    """Weekly price/dividend/contribution schedules for a batch of scenarios.
+
+    With ``start_week`` (a multiple of 52) only the weeks after it are built,
+    and ``levels`` starts at that year.
+    """
+    n_years = total_weeks // WEEKS_PER_YEAR
+    first_year = start_week // WEEKS_PER_YEAR
+    guard = np.array([p.guardrails_on for p in ps])
+    floor = np.array([p.price_floor_usd if p.guardrails_on and p.price_floor_usd is not None
+                      else -np.inf for p in ps])
+    cut_at = np.array([p.cut_threshold_usd if p.guardrails_on and p.cut_threshold_usd is not None
+                       else -np.inf for p in ps])
+    price0 = _field(ps, "price0")
+    s = _scenario_inputs(ps, n_years, first_year)
+
+    px = price_path(price0, _field(ps, "g_px"), total_weeks, floor, start_week)
+    s.update(
+        px=px,
+        div=dividend_schedule(s["levels"][..., :n_years - first_year], px, _field(ps, "div_interval"),
+                              cut_at, _field(ps, "cut_percent"), start_week),
+        extra=contribution_schedule(_field(ps, "extra_invest"), _field(ps, "extra_interval"), total_weeks,
+                                    start_week),
+        init_shares=(s["init_invest"] / s["exch"]) / price0,
+        cap=cap_multiplier(guard, _field(ps, "max_shares_growth_y")),
+    )
+    return s
+
+
+def _derived(out, s):
+    """Run-rate, cumulative contributions and balance from the yearly state."""
+    out["runrate"] = out["shares_end"] * s["levels"][..., 1:] * (s["periods"] * s["exch"] * NET_OF_TAX)[:, None]
+    out["contrib_cum"] = s["init_invest"][:, None] + np.cumsum(out["contrib_year"], axis=-1)
+    out["balance"] = out["shares_end"] * out["px_end"] * s["exch"][:, None]
+    return out
+
+
+@timed("ulty_simulation_seconds", kind="batch")
+@np.errstate(over="ignore", invalid="ignore")
+def simulate_drip_batch(ps, weekly=False):
+    """Run many :class:`DripParams` (same horizon) as one batched computation.
+
+    Every field except ``years`` may differ between scenarios; disabled
+    guardrails become thresholds of ``-inf`` so the masks are no-ops.
+    Returns ``(len(ps), years)`` arrays (and weekly ones, see :func:`drip_core`,
+    plus the ``px_week`` price path).
+    """
+    horizons = {int(p.years * WEEKS_PER_YEAR) for p in ps}
+    if len(horizons) != 1:
+        raise ValueError("simulate_drip_batch needs a single horizon")
+    s = _schedules(ps, horizons.pop())
+    out = drip_core(s["px"], s["div"], s["extra"], s["exch"], s["init_shares"], s["cap"], weekly)
+    _derived(out, s)
+    if weekly:
+        out["px_week"] = s["px"]
+    return out
+
+
+def simulate_drip_arrays(p: DripParams, weekly=False):
+    """Build the schedules for ``p`` and run the engine; yearly arrays out."""
+    return {k: v[0] for k, v in simulate_drip_batch([p], weekly).items()}
+
+
+# --- Incremental simulation ---
+CHECKPOINT_FIELDS = ("shares_end", "px_end", "div_year", "contrib_year")
+
+
+class CheckpointCache:
+    """Thread-safe LRU of per-year DRIP state, bounded by bytes and per owner.
+
+    Entries are dicts of ``(years,)`` arrays; their ``nbytes`` is tracked and
+    the least recently used entries go once ``max_bytes`` is exceeded.  An
+    ``owner`` (one Streamlit session) holds at most ``per_owner`` entries, so
+    one busy session cannot evict everybody else's state.
+    """
+
+    def __init__(self, max_bytes=32 * 2**20, per_owner=64):
+        self.max_bytes = max_bytes
+        self.per_owner = per_owner
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # key -> (value, nbytes, owner)
+        self._owners = {}  # owner -> OrderedDict of keys
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            if entry[2] is not None:
+                self._owners[entry[2]].move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def _drop(self, key):
+        value, nbytes, owner = self._data.pop(key)
+        self.nbytes -= nbytes
+        if owner is not None:
+            keys = self._owners[owner]
+            del keys[key]
+            if not keys:
+                del self._owners[owner]
+
+    def put(self, key, value, owner=None):
+        nbytes = sum(a.nbytes for a in value.values())
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (value, nbytes, owner)
+            self.nbytes += nbytes
+            if owner is not None:
+                keys = self._owners.setdefault(owner, OrderedDict())
+                keys[key] = None
+                while len(keys) > self.per_owner:
+                    self._drop(next(iter(keys)))
+            while self.nbytes > self.max_bytes and len(self._data) > 1:
+                self._drop(next(iter(self._data)))
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._owners.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._data), "bytes": self.nbytes, "owners": len(self._owners),
+                    "hits": self.hits, "misses": self.misses}
+
+    def __len__(self):
+        return len(self._data)
+
+
+CHECKPOINTS = CheckpointCache()
+
+
+@timed("ulty_simulation_seconds", kind="incremental")
+@np.errstate(over="ignore", invalid="ignore")
+def simulate_drip_incremental(p: DripParams, cache=CHECKPOINTS, owner=None):
+    """:func:`simulate_drip_arrays` that reuses earlier runs of the same scenario.
+
+    Every field except ``years`` shapes the first weeks, so the state is
+    keyed by ``p`` with ``years`` cleared and holds one checkpoint per
+    simulated year (shares, which are also next year's cap base, price,
+    dividends and contributions).  A shorter horizon is a slice; a longer one
+    resumes :func:`drip_core` from the last stored year-end.
+    """
+    n_years = int(p.years)
+    key = replace(p, years=0)
+    state = cache.get(key)
+    done = 0 if state is None else len(state["shares_end"])
+    inc("ulty_checkpoint_requests_total", result="miss" if state is None else "extend" if done < n_years else "hit")
+    if done < n_years:
+        s = _schedules([p], n_years * WEEKS_PER_YEAR, done * WEEKS_PER_YEAR)  # new weeks only
+        init_shares = s["init_shares"] if state is None else state["shares_end"][-1]
+        tail = drip_core(s["px"], s["div"], s["extra"], s["exch"], init_shares, s["cap"])
+        tail = {k: tail[k][0] for k in CHECKPOINT_FIELDS}
+        state = tail if state is None else {k: np.concatenate([state[k], tail[k]]) for k in CHECKPOINT_FIELDS}
+        cache.put(key, state, owner)
+    out = {k: v[None, :n_years] for k, v in state.items()}
+    out["div_cum"] = np.cumsum(out["div_year"], axis=-1)
+    return {k: v[0] for k, v in _derived(out, _scenario_inputs([p], n_years)).items()}
+
+
+def to_records(out, init_invest):
+    """Annual result rows in the shape MODE 4 renders."""
+    records = []
+    for i in range(out["shares_end"].shape[-1]):
+        runrate = float(out["runrate"][i])
+        contrib = float(out["contrib_cum"][i])
+        records.append({
+            "Year": i + 1,
+            "End-of-Year Balance": round(float(out["balance"][i]), 2),
+            "Shares (end)": round(float(out["shares_end"][i]), 6),
+            "Price (end)": round(float(out["px_end"][i]), 4),
+            "Dividends Received (this year)": round(float(out["div_year"][i]), 2),
+            "Total Dividends (cum)": round(float(out["div_cum"][i]), 2),
+            "Next 12M Run-rate": round(runrate, 2),
+            "YoC (initial)": round((runrate / init_invest) * 100, 2) if init_invest > 0 else 0.0,
+            "YoC (contrib)": round((runrate / contrib) * 100, 2) if contrib > 0 else 0.0,
+        })
+    return records
+
+
+def simulate_drip(p: DripParams):
+    """Deterministic MODE 4 simulation; returns the list of annual records."""
+    return to_records(simulate_drip_arrays(p), p.init_invest)
+
+
+# --- Monte Carlo ---
+MC_PERCENTILES = (5, 25, 50, 75, 95)
+MC_BLOCK = 500         # paths per random stream; a seed gives the same paths at any batch size
+_MC_BLOCKS_PER_RUN = 5  # blocks handed to drip_core together
+
+
+def mc_price_paths(rng, n_paths, price0, g_px, px_vol, total_weeks, price_floor_usd=None):
+    """Log-normal weekly price paths whose median follows the deterministic path."""
+    drift = np.log1p(g_px) / WEEKS_PER_YEAR
+    # float32 draws halve the RNG cost; the walk itself accumulates in float64
+    shocks = rng.standard_normal((n_paths, total_weeks), dtype=np.float32)
+    log_px = np.cumsum(shocks, axis=-1, dtype=float)
+    log_px *= px_vol / np.sqrt(WEEKS_PER_YEAR)
+    log_px += drift * week_index(total_weeks) + np.log(price0)
+    px = np.exp(log_px, out=log_px)
+    if price_floor_usd is not None:
+        np.maximum(px, price_floor_usd, out=px)
+    return px
+
+
+def mc_dividend_levels(rng, n_paths, base_div_usd, g_div, div_vol, n_years):
+    """Step-yearly dividend levels with a log-normal shock at every year change."""
+    shocks = rng.standard_normal((n_paths, n_years)) * div_vol + np.log1p(g_div)
+    shocks[:, 0] = 0.0
+    return base_div_usd * np.exp(np.cumsum(shocks, axis=-1))
+
+
+@timed("ulty_simulation_seconds", kind="monte_carlo")
+def simulate_drip_mc(p: DripParams, n_paths=10_000, px_vol=0.30, div_vol=0.15,
+                     div_week_vol=0.0, seed=None, percentiles=MC_PERCENTILES):
+    """Monte Carlo version of :func:`simulate_drip`.
+
+    ``px_vol`` is the annualised price volatility, ``div_vol`` the yearly
+    dividend-level volatility and ``div_week_vol`` an extra per-payment noise.
+    Every block of ``MC_BLOCK`` paths has its own child of
+    ``SeedSequence(seed)``, split again into one stream each for price,
+    dividend-level and per-payment shocks that are drawn row by row, so
+    path ``i`` depends only on ``seed``, ``i`` and ``p`` (not ``n_paths``).
+    Blocks run through :func:`drip_core` a few at a time, so the guardrails
+    apply per path.  Returns ``(len(percentiles), years)`` bands for end
+    balance, cumulative dividends and next-12M run-rate.
+    """
+    n_blocks = -(-n_paths // MC_BLOCK)
+    streams = np.random.SeedSequence(seed).spawn(n_blocks)
+    total_weeks = int(p.years * WEEKS_PER_YEAR)
+    n_years = total_weeks // WEEKS_PER_YEAR
+    floor = p.price_floor_usd if p.guardrails_on else None
+    cut_at = p.cut_threshold_usd if p.guardrails_on else None
+    if p.extra_invest:
+        extra = contribution_schedule(p.extra_invest, p.extra_interval, total_weeks)
+    else:
+        extra = np.zeros(total_weeks)
+    cap = cap_multiplier(p.guardrails_on, p.max_shares_growth_y)
+    periods = int(WEEKS_PER_YEAR / p.div_interval)
+    init_shares = (p.init_invest / p.exch) / p.price0
+
+    balance = np.empty((n_paths, n_years))
+    div_cum = np.empty((n_paths, n_years))
+    runrate = np.empty((n_paths, n_years))
+    for b0 in range(0, n_blocks, _MC_BLOCKS_PER_RUN):
+        lo = b0 * MC_BLOCK
+        n = min(_MC_BLOCKS_PER_RUN * MC_BLOCK, n_paths - lo)
+        px = np.empty((n, total_weeks))
+        levels = np.empty((n, n_years + 1))
+        div = np.empty((n, total_weeks))
+        for i in range(0, n, MC_BLOCK):
+            px_rng, div_rng, week_rng = map(np.random.default_rng, streams[b0 + i // MC_BLOCK].spawn(3))
+            m = min(MC_BLOCK, n - i)
+            px[i:i + m] = mc_price_paths(px_rng, m, p.price0, p.g_px, px_vol, total_weeks, floor)
+            levels[i:i + m] = mc_dividend_levels(div_rng, m, p.base_div_usd, p.g_div, div_vol, n_years + 1)
+            div[i:i + m] = dividend_schedule(levels[i:i + m, :n_years], px[i:i + m], p.div_interval,
+                                             cut_at, p.cut_percent)
+            if div_week_vol:
+                div[i:i + m] *= np.exp(week_rng.standard_normal((m, total_weeks)) * div_week_vol
+                                       - 0.5 * div_week_vol ** 2)
+        out = drip_core(px, div, extra, p.exch, init_shares, cap)
+        balance[lo:lo + n] = out["shares_end"] * out["px_end"] * p.exch
+        div_cum[lo:lo + n] = out["div_cum"]
+        runrate[lo:lo + n] = out["shares_end"] * levels[:, 1:] * periods * p.exch * NET_OF_TAX
+
+    q = list(percentiles)
+    return {
+        "percentiles": q,
+        "balance": np.percentile(balance, q, axis=0),
+        "div_cum": np.percentile(div_cum, q, axis=0),
+        "runrate": np.percentile(runrate, q, axis=0),
+        "n_paths": n_paths,
+    }
+
+
+# --- Parameter sweep ---
+class LRUCache:
+    """Small thread-safe LRU mapping shared by all Streamlit sessions."""
+
+    def __init__(self, maxsize=10_000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+SWEEP_CACHE = LRUCache(maxsize=50_000)
+
+
+@timed("ulty_simulation_seconds", kind="sweep")
+def sweep_drip(base: DripParams, grid, cache=SWEEP_CACHE):
+    """Evaluate ``base`` over the cartesian product of ``grid``.
+
+    ``grid`` maps :class:`DripParams` field names (``g_px``, ``g_div``,
+    ``extra_invest``, ``max_shares_growth_y`` ...) to value lists.  Cells
+    already in ``cache`` are reused; the rest run in one
+    :func:`simulate_drip_batch` call.  Result arrays have one axis per grid
+    entry, in ``grid`` order, and hold the final-year value.
+    """
+    names = list(grid)
+    axes = [list(grid[n]) for n in names]
+    cells = [replace(base, **dict(zip(names, combo))) for combo in itertools.product(*axes)]
+
+    results = [cache.get(c) if cache is not None else None for c in cells]
+    todo = [i for i, r in enumerate(results) if r is None]
+    if todo:
+        out = simulate_drip_batch([cells[i] for i in todo])
+        for j, i in enumerate(todo):
+            contrib = out["contrib_cum"][j, -1]
+            runrate = out["runrate"][j, -1]
+            results[i] = (
+                out["balance"][j, -1],
+                out["div_cum"][j, -1],
+                runrate,
+                runrate / cells[i].init_invest * 100 if cells[i].init_invest > 0 else 0.0,
+                runrate / contrib * 100 if contrib > 0 else 0.0,
+            )
+            if cache is not None:
+                cache.put(cells[i], results[i])
+
+    shape = tuple(len(a) for a in axes)
+    cols = np.array(results, dtype=float).reshape(shape + (5,))
+    return {
+        "axes": dict(zip(names, axes)),
+        "balance": cols[..., 0],
+        "div_cum": cols[..., 1],
+        "runrate": cols[..., 2],
+        "yoc_initial": cols[..., 3],
+        "yoc_contrib": cols[..., 4],
+        "computed": len(todo),
+    }
@@ -1,115 +1,68 @@
 import streamlit as st
-import pandas as pd
-import requests
-import yfinance as yf
-import datetime as dt
-
-# --- Live weekly dividend fetcher with caching and fallbacks ---
-@st.cache_data(ttl=60*60, show_spinner=False)
-def fetch_latest_weekly_dividend_usd(ticker: str = "ULTY"):
-    try:
-        s = yf.Ticker(ticker).dividends
-        if s is not None and len(s) > 0:
-            last_amt = float(s.iloc[-1])
-            if last_amt > 0:
-                return last_amt, s.index[-1].to_pydatetime()
-    except Exception:
-        pass
-    try:
-        url = "https://yieldmaxetfs.com/ulty"
-        tables = pd.read_html(url)
-        for df in tables:
-            cols = [str(c).lower() for c in df.columns]
-            if any(k in ''.join(cols) for k in ["amount", "distribution", "dividend"]):
-                for c in df.columns:
-                    if any(k in str(c).lower() for k in ["amount", "distribution", "dividend"]):
-                        series = (
-                            df[c].astype(str)
-                            .str.replace("$", "", regex=False)
-                            .str.replace(",", "", regex=False)
-                            .str.extract(r"([0-9]*\.?[0-9]+)")[0]
-                            .astype(float)
-                            .dropna()
-                        )
-                        if len(series) > 0:
-                            return float(series.iloc[0]), None
-    except Exception:
-        pass
-    try:
-        hdr = {"User-Agent": "Mozilla/5.0"}
-        url = f"https://api.nasdaq.com/api/quote/{ticker}/dividends?assetclass=etf"
-        r = requests.get(url, headers=hdr, timeout=10)
-        js = r.json()
-        rows = js.get("data", {}).get("dividends", {}).get("rows", [])
-        if rows:
-            amt_str = rows[0].get("cashAmount") or rows[0].get("amount") or ""
-            amt = float(str(amt_str).replace("$", "").replace(",", ""))
-            if amt > 0:
-                return amt, None
-    except Exception:
-        pass
-    return None, None
-
-import yfinance as yf
-import requests
-from streamlit_autorefresh import st_autorefresh
-import json
-import pandas as pd
-
-# === โหลดปันผลล่าสุด ===
-def load_latest_dividend():
-    try:
-        with open("latest_dividend.json", "r") as f:
-            return json.load(f).get("dividend", 0.0)
-    except:
-        return 0.0
-
-weekly_dividend_usd = load_latest_dividend()
+from ulty_profile import RerunProfile, lazy_import
+
+profile = RerunProfile()
+with profile.span("imports"):
+    import datetime as dt
+    import numpy as np
+    from streamlit_autorefresh import st_autorefresh
+    import ulty_charts
+    import ulty_ledger
+    import ulty_market
+    import ulty_metrics
+    from ulty_metrics import count_error
+    from ulty_calc import (DIVIDEND_PER_SHARE_WEEKLY_DEFAULT, REINVEST_DIVIDEND_USD, REINVEST_STOCK_PRICE,
+                           calculate_required_investment, calculate_weekly_dividend, payback_curve,
+                           payback_weeks_analytic, total_received_at)
+    import uuid
+    from ulty_sim import (CHECKPOINTS, CUT_PERCENT, CUT_THRESHOLD_USD, MAX_SHARES_GROWTH_Y, PRICE_FLOOR_USD,
+                          DripParams, FREQ_TO_WEEKS, SWEEP_CACHE, WEEKS_PER_YEAR, simulate_drip_arrays,
+                          simulate_drip_incremental, simulate_drip_mc, sweep_drip, to_records)
+# pandas, matplotlib (ผ่าน ulty_charts) และ ulty_backtest (yfinance) โหลดเมื่อใช้งานในโหมดนั้นๆ เท่านั้น
 
 st_autorefresh(interval=5 * 60 * 1000, key="datarefresh")
-
-ULTY_TICKER = "ULTY"
-DIVIDEND_PER_SHARE_WEEKLY_DEFAULT = 0.104  # fallback
-live_div_amt, live_div_date = fetch_latest_weekly_dividend_usd("ULTY")
-DIVIDEND_PER_SHARE_WEEKLY = live_div_amt if live_div_amt is not None else DIVIDEND_PER_SHARE_WEEKLY_DEFAULT
-
-# === ราคาหุ้น & อัตราแลกเปลี่ยน ===
-def get_stock_price():
-    ticker = yf.Ticker(ULTY_TICKER)
-    hist = ticker.history(period="1d")
-    if not hist.empty:
-        return round(hist["Close"].iloc[-1], 2)
-    return None
-
-def get_exchange_rate():
-    try:
-        res = requests.get("https://api.frankfurter.app/latest?from=USD&to=THB")
-        data = res.json()
-        return round(data["rates"]["THB"], 2)
-    except:
-        return None
-
-# === คำนวณ ===
-def calculate_weekly_dividend(amount_thb, stock_price_usd, exchange_rate):
-    usd = amount_thb / exchange_rate
-    shares = usd / stock_price_usd
-    dividend_usd = shares * DIVIDEND_PER_SHARE_WEEKLY
-    return round(dividend_usd * exchange_rate, 2)
-
-def calculate_required_investment(target_weekly_dividend_thb, stock_price_usd, exchange_rate):
-    shares_needed = target_weekly_dividend_thb / (DIVIDEND_PER_SHARE_WEEKLY * exchange_rate)
-    total_usd = shares_needed * stock_price_usd
-    total_thb = total_usd * exchange_rate
-    return round(shares_needed), round(total_thb, 2)
-
+ulty_metrics.serve_from_env()  # /metrics เมื่อกำหนด ULTY_METRICS_PORT
+
+ULTY_TICKER = ulty_market.ULTY_TICKER
+session_id = st.session_state.setdefault("session_id", uuid.uuid4().hex)  # โควตา cache ต่อ session
+LEDGER_FLAG_NAMES = [
+    (ulty_ledger.FLAG_PAID, "paid"),
+    (ulty_ledger.FLAG_PRICE_FLOOR, "price floor"),
+    (ulty_ledger.FLAG_DIV_CUT, "dividend cut"),
+    (ulty_ledger.FLAG_SHARES_CAP, "shares cap"),
+]
+
+# === คำนวณ (ดู ulty_calc.py) ===
 def parse_comma_input(text, default=0.0):
     try:
         return float(text.replace(",", ""))
-    except:
+    except ValueError:
         return default
 
-stock_price = get_stock_price()
-exchange_rate = get_exchange_rate()
+def guardrail_inputs():
+    # Reality guardrails toggle
+    guardrails_on = st.checkbox("🛡️ Enable Reality guardrails", value=True)
+    if guardrails_on:
+        with st.expander("Reality guardrails (advanced)"):
+            price_floor_usd = st.number_input("Price floor (USD)", value=PRICE_FLOOR_USD, min_value=0.0, step=0.01)
+            cut_threshold_usd = st.number_input("Dividend cut when price < (USD)", value=CUT_THRESHOLD_USD, min_value=0.0, step=0.01)
+            cut_percent = st.number_input("Cut percentage (%)", value=CUT_PERCENT, min_value=0.0, max_value=100.0, step=1.0)
+            max_shares_growth_y = st.number_input("Cap shares growth per year (%) (0=off)", value=MAX_SHARES_GROWTH_Y, min_value=0.0, step=10.0)
+    else:
+        price_floor_usd = None
+        cut_threshold_usd = None
+        cut_percent = 0.0
+        max_shares_growth_y = 0.0
+    return guardrails_on, price_floor_usd, cut_threshold_usd, cut_percent, max_shares_growth_y
+
+def format_age(seconds):
+    if seconds is None:
+        return "ยังไม่มีข้อมูล"
+    if seconds < 60:
+        return f"อัปเดต {int(seconds)} วินาทีที่แล้ว"
+    if seconds < 3600:
+        return f"อัปเดต {int(seconds // 60)} นาทีที่แล้ว"
+    return f"อัปเดต {seconds / 3600:.1f} ชั่วโมงที่แล้ว"
 
 col_logo, col_title = st.columns([1, 8])
 with col_logo:
@@ -118,10 +71,27 @@ with col_title:
     st.title(" Yieldmax ULTY Calculator (Real-time)")
 st.markdown("อัปเดตราคาหุ้น อัตราแลกเปลี่ยน และปันผลรายสัปดาห์ พร้อมคำนวณเงินลงทุนแบบเรียลไทม์")
 
+# วาด layout ก่อน แล้วค่อยเติมข้อมูลเมื่อดึงเสร็จ
 col1, col2, col3 = st.columns(3)
-col1.metric("\U0001F4C9 ราคาหุ้น ULTY", f"{stock_price} USD" if stock_price else "-")
-col2.metric("\U0001F4B1 อัตราแลกเปลี่ยน", f"{exchange_rate} THB/USD" if exchange_rate else "-")
-col3.metric("\U0001F4B0 ปันผลล่าสุด/สัปดาห์", f"{DIVIDEND_PER_SHARE_WEEKLY} USD")
+slot_price, slot_fx, slot_div = col1.empty(), col2.empty(), col3.empty()
+slot_price.metric("\U0001F4C9 ราคาหุ้น ULTY", "…")
+slot_fx.metric("\U0001F4B1 อัตราแลกเปลี่ยน", "…")
+slot_div.metric("\U0001F4B0 ปันผลล่าสุด/สัปดาห์", "…")
+
+# === ราคาหุ้น อัตราแลกเปลี่ยน & ปันผล (shared store, refresh เบื้องหลัง) ===
+with profile.span("market data"):
+    market = ulty_market.get_market_data(ULTY_TICKER)
+live_div_amt, live_div_date = market.dividend, market.dividend_date
+DIVIDEND_PER_SHARE_WEEKLY = live_div_amt if live_div_amt is not None else DIVIDEND_PER_SHARE_WEEKLY_DEFAULT
+stock_price = market.price
+exchange_rate = market.exchange_rate
+
+slot_price.metric("\U0001F4C9 ราคาหุ้น ULTY", f"{stock_price} USD" if stock_price else "-")
+slot_fx.metric("\U0001F4B1 อัตราแลกเปลี่ยน", f"{exchange_rate} THB/USD" if exchange_rate else "-")
+slot_div.metric("\U0001F4B0 ปันผลล่าสุด/สัปดาห์", f"{DIVIDEND_PER_SHARE_WEEKLY} USD")
+col1.caption(format_age(market.ages["price"]))
+col2.caption(format_age(market.ages["fx"]))
+col3.caption(format_age(market.ages["dividend"]))
 
 st.markdown("---")
 
@@ -129,7 +99,8 @@ mode = st.radio("เลือกโหมดคำนวณ", [
     "\U0001F4CD อยากได้ปันผลเท่าไหร่",
     "💼 คำนวณจากต้นทุน",
     "🔄 จำลองจุดคุ้มทุนแบบ Reinvest",
-    "📈 จำลองผลตอบแทนแบบ Reinvest ระยะยาว (DRIP)"
+    "📈 จำลองผลตอบแทนแบบ Reinvest ระยะยาว (DRIP)",
+    "🕰️ Backtest ย้อนหลังด้วยข้อมูลจริง"
 ], horizontal=True)
 
 # === MODE 1: อยากได้ปันผลเท่าไหร่ ===
@@ -146,7 +117,7 @@ if mode == "\U0001F4CD อยากได้ปันผลเท่าไหร
         weekly_div = monthly_div / 4
 
     if stock_price and exchange_rate:
-        shares_needed, total_investment = calculate_required_investment(weekly_div / 0.85, stock_price, exchange_rate)
+        shares_needed, total_investment = calculate_required_investment(weekly_div / 0.85, stock_price, exchange_rate, DIVIDEND_PER_SHARE_WEEKLY)
         st.subheader("\U0001F4C9 ผลลัพธ์")
         st.markdown(f"- จำนวนหุ้นที่ต้องซื้อ: **{shares_needed:,} หุ้น**")
         st.markdown(f"- เงินลงทุนรวม: **{total_investment:,.2f} บาท**")
@@ -163,7 +134,7 @@ elif mode == "💼 คำนวณจากต้นทุน":
     investment = parse_comma_input(investment_input, default=1000.0)
 
     if stock_price and exchange_rate:
-        weekly = calculate_weekly_dividend(investment, stock_price, exchange_rate)
+        weekly = calculate_weekly_dividend(investment, stock_price, exchange_rate, DIVIDEND_PER_SHARE_WEEKLY)
         tax_amount = weekly * 0.15
         weekly_after_tax = weekly * 0.85
         st.success(f"✅ ปันผลรายสัปดาห์ (ก่อนหักภาษี) ≈ {weekly:,.2f} บาท")
@@ -180,26 +151,28 @@ elif mode == "🔄 จำลองจุดคุ้มทุนแบบ Reinve
     investment_input = st.text_input("💵 เงินลงทุนเริ่มต้น (บาท)", value="100,000.00")
     investment = parse_comma_input(investment_input, default=100000.0)
 
-    reinvest_stock_price = 6.40
-    reinvest_dividend_usd = 0.0875
-
     if exchange_rate:
-        shares = (investment / exchange_rate) / reinvest_stock_price
-        total_received_thb = 0
-        weeks = 0
-
-        while total_received_thb < investment and weeks < 1000:
-            dividend_thb = shares * reinvest_dividend_usd * exchange_rate * 0.85
-            total_received_thb += dividend_thb
-            shares += (dividend_thb / exchange_rate) / reinvest_stock_price
-            weeks += 1
-
-        years = weeks // 52
-        months = (weeks % 52) // 4
-        days = (weeks % 52) % 4 * 7
-
-        st.success(f"📆 คาดว่าจะคืนทุนได้ใน {weeks:,} สัปดาห์ ≈ **{years} ปี {months} เดือน {days} วัน**")
-        st.info(f"📈 ปันผลรวมสะสม: **{total_received_thb:,.2f} บาท**")
+        payback = float(payback_weeks_analytic(REINVEST_STOCK_PRICE, REINVEST_DIVIDEND_USD))
+        if np.isfinite(payback):
+            weeks = int(payback)
+            total_received_thb = float(total_received_at(investment, REINVEST_STOCK_PRICE, REINVEST_DIVIDEND_USD, weeks))
+
+            years = weeks // 52
+            months = (weeks % 52) // 4
+            days = (weeks % 52) % 4 * 7
+
+            st.success(f"📆 คาดว่าจะคืนทุนได้ใน {weeks:,} สัปดาห์ ≈ **{years} ปี {months} เดือน {days} วัน**")
+            st.info(f"📈 ปันผลรวมสะสม: **{total_received_thb:,.2f} บาท**")
+        else:
+            st.warning("ปันผลเป็นศูนย์ ไม่สามารถคืนทุนได้")
+
+        # Payback curve across dividend assumptions (closed form, one call)
+        st.subheader("📉 Payback curve")
+        div_range = np.round(np.linspace(0.02, 0.20, 91), 4)
+        curve = payback_curve(investment, exchange_rate, REINVEST_STOCK_PRICE, div_range)
+        pd = lazy_import("pandas")
+        st.line_chart(pd.DataFrame({"Payback (weeks)": curve}, index=pd.Index(div_range, name="Dividend ($/week)")))
+        st.caption(f"ที่ราคาหุ้น ${REINVEST_STOCK_PRICE:.2f}, หักภาษี 15% และ reinvest ทุกสัปดาห์")
     else:
         st.error("ไม่สามารถดึงอัตราแลกเปลี่ยนได้")
 
@@ -217,7 +190,7 @@ elif mode == "📈 จำลองผลตอบแทนแบบ Reinvest ร
         else:
             ts = dt.datetime.now().strftime("%Y-%m-%d %H:%M")
         st.caption(f"Last updated at: {ts}")
-    except Exception:
+    except (TypeError, ValueError):
         st.metric(label="💰 Latest Dividend (USD per period)", value="N/A")
         st.caption("Last updated at: --")
 
@@ -234,7 +207,7 @@ elif mode == "📈 จำลองผลตอบแทนแบบ Reinvest ร
             dividend_amount_input = st.number_input("💵 Dividend Amount ($ per period)", value=float(DIVIDEND_PER_SHARE_WEEKLY), min_value=0.0, disabled=use_live_div)
         with colB:
             if st.button("Refresh live"):
-                fetch_latest_weekly_dividend_usd.clear()
+                ulty_market.invalidate("dividend")
                 st.rerun()
         dividend_freq = st.selectbox("🗓️ Dividend Frequency", ["Weekly", "Monthly", "Quarterly"], index=0)
     with col2:
@@ -245,25 +218,13 @@ elif mode == "📈 จำลองผลตอบแทนแบบ Reinvest ร
     share_price_growth_input = st.number_input("🏷️ Share Price Growth (%/yr, comp-weekly)", value=0.0)
 
     # Reality guardrails toggle
-    guardrails_on = st.checkbox("🛡️ Enable Reality guardrails", value=True)
-    if guardrails_on:
-        with st.expander("Reality guardrails (advanced)"):
-            price_floor_usd = st.number_input("Price floor (USD)", value=0.50, min_value=0.0, step=0.01)
-            cut_threshold_usd = st.number_input("Dividend cut when price < (USD)", value=1.00, min_value=0.0, step=0.01)
-            cut_percent = st.number_input("Cut percentage (%)", value=50.0, min_value=0.0, max_value=100.0, step=1.0)
-            max_shares_growth_y = st.number_input("Cap shares growth per year (%) (0=off)", value=300.0, min_value=0.0, step=10.0)
-    else:
-        price_floor_usd = None
-        cut_threshold_usd = None
-        cut_percent = 0.0
-        max_shares_growth_y = 0.0
+    guardrails_on, price_floor_usd, cut_threshold_usd, cut_percent, max_shares_growth_y = guardrail_inputs()
 
     if not stock_price or not exchange_rate:
         st.error("❌ ไม่สามารถดึงข้อมูลราคาหุ้นหรืออัตราแลกเปลี่ยน")
     else:
         # --- Parse inputs & set context ---
         init_invest = parse_comma_input(init_invest_input)
-        total_weeks = int(years_input * 52)
 
         is_thb = currency == "THB"
         exch = exchange_rate if is_thb else 1.0
@@ -274,84 +235,33 @@ elif mode == "📈 จำลองผลตอบแทนแบบ Reinvest ร
         g_px  = share_price_growth_input / 100.0    # per year (comp weekly)
 
         # Frequency mappings (weekly sim)
-        freq_to_weeks = {"Weekly": 1, "Monthly": 4, "Quarterly": 13}
-        div_interval = freq_to_weeks.get(dividend_freq, 1)
+        div_interval = FREQ_TO_WEEKS.get(dividend_freq, 1)
         extra_interval = 1 if extra_invest_freq == "Weekly" else 4
 
         base_div_per_period_usd_y0 = float(DIVIDEND_PER_SHARE_WEEKLY) if use_live_div else float(dividend_amount_input)
 
-        # --- Initial state ---
-        shares = (init_invest / exch) / price0
-        total_div_cum = 0.0
-        div_this_year = 0.0
-        total_contrib = init_invest
-        records = []
-        shares_year_start = shares
-
-        # --- Simulation (weekly) ---
-        for week in range(1, total_weeks + 1):
-            year_idx = (week - 1) // 52  # 0-based year index
-
-            # Price evolves weekly (compounding weekly based on annual rate)
-            px = price0 * ((1 + g_px) ** (week / 52.0))
-
-            # Apply price floor if guardrails are on
-            if guardrails_on and price_floor_usd is not None and px < price_floor_usd:
-                px = price_floor_usd
-
-            # Dividend per period (USD) grows step-yearly
-            div_per_period_usd = base_div_per_period_usd_y0 * ((1 + g_div) ** year_idx)
-            # Apply dividend cut if price below threshold
-            if guardrails_on and cut_threshold_usd is not None and px < cut_threshold_usd:
-                div_per_period_usd *= (1 - (cut_percent / 100.0))
-
-            # Pay dividend only on specified frequency weeks
-            if week % div_interval == 0 and div_per_period_usd > 0:
-                div_net_ccy = shares * div_per_period_usd * exch * 0.85
-            else:
-                div_net_ccy = 0.0
-
-            # Receive dividend and DRIP
-            weekly_div_net_ccy = div_net_ccy
-            total_div_cum += weekly_div_net_ccy
-            div_this_year += weekly_div_net_ccy
-            shares += (weekly_div_net_ccy / exch) / px
-
-            # Extra invest based on frequency
-            if extra_invest and extra_invest != 0.0 and (week % extra_interval == 0):
-                total_contrib += extra_invest
-                shares += (extra_invest / exch) / px
-
-            # Close year (every 52 weeks): record end-of-year snapshot
-            if week % 52 == 0:
-                # Cap shares growth per year if enabled
-                if guardrails_on and max_shares_growth_y and max_shares_growth_y > 0:
-                    cap_multiplier = 1.0 + (max_shares_growth_y / 100.0)
-                    max_allowed_shares = shares_year_start * cap_multiplier
-                    if shares > max_allowed_shares:
-                        shares = max_allowed_shares
-
-                end_balance = shares * px * exch
-
-                # Next 12M run-rate uses dividend rate of the next year & correct number of periods
-                next_year_div_runrate = shares * (base_div_per_period_usd_y0 * ((1 + g_div) ** (year_idx + 1))) * int(52/div_interval) * exch * 0.85
-
-                record = {
-                    "Year": year_idx + 1,
-                    "End-of-Year Balance": round(end_balance, 2),
-                    "Shares (end)": round(shares, 6),
-                    "Price (end)": round(px, 4),
-                    "Dividends Received (this year)": round(div_this_year, 2),
-                    "Total Dividends (cum)": round(total_div_cum, 2),
-                    "Next 12M Run-rate": round(next_year_div_runrate, 2),
-                    "YoC (initial)": round((next_year_div_runrate / init_invest) * 100, 2) if init_invest > 0 else 0.0,
-                    "YoC (contrib)": round((next_year_div_runrate / total_contrib) * 100, 2) if total_contrib > 0 else 0.0,
-                }
-                records.append(record)
-                # reset yearly trackers
-                div_this_year = 0.0
-                shares_year_start = shares
-
+        # --- Simulation (vectorized engine, see ulty_sim.py) ---
+        params = DripParams(
+            init_invest=init_invest,
+            price0=price0,
+            base_div_usd=base_div_per_period_usd_y0,
+            years=int(years_input),
+            exch=exch,
+            g_px=g_px,
+            g_div=g_div,
+            div_interval=div_interval,
+            extra_invest=float(extra_invest),
+            extra_interval=extra_interval,
+            guardrails_on=guardrails_on,
+            price_floor_usd=price_floor_usd,
+            cut_threshold_usd=cut_threshold_usd,
+            cut_percent=cut_percent,
+            max_shares_growth_y=max_shares_growth_y,
+        )
+        with profile.span("simulate_drip"):
+            records = to_records(simulate_drip_incremental(params, owner=session_id), params.init_invest)
+
+        pd = lazy_import("pandas")
         df = pd.DataFrame(records)
 
         # --- Table ---
@@ -367,16 +277,172 @@ elif mode == "📈 จำลองผลตอบแทนแบบ Reinvest ร
             "YoC (contrib)": "{:,.2f}%",
         }))
 
-        # --- Chart --- (single plot, default colors)
+        # --- Chart --- (cached PNG, or a native chart of the weekly path)
         st.subheader("📊 Portfolio Chart (End of Year)")
-        import matplotlib.pyplot as plt
-        fig, ax = plt.subplots(figsize=(10, 5))
-        x = df["Year"].astype(str)
-        ax.bar(x, df["End-of-Year Balance"], label="Portfolio Value (End of Year)")
-        ax.bar(x, df["Total Dividends (cum)"], label="Cumulative Dividends", alpha=0.5)
-        ax.plot(x, df["Next 12M Run-rate"], label="Next 12M Dividend Run-rate", linewidth=2, marker="o")
-        ax.set_ylabel(f"Value ({label_currency})")
-        ax.set_xlabel("Year")
-        ax.set_title("Portfolio Growth with DRIP")
-        ax.legend()
-        st.pyplot(fig)
+        native_charts = st.radio("Chart style", ["Image", "Interactive (native)"], horizontal=True) != "Image"
+        if native_charts:
+            wk = simulate_drip_arrays(params, weekly=True)
+            week_axis = np.arange(1, wk["shares_week"].shape[-1] + 1) / 52
+            st.line_chart(ulty_charts.native_frame(week_axis, {
+                "Portfolio Value": wk["shares_week"] * wk["px_week"] * params.exch,
+                "Cumulative Dividends": np.cumsum(wk["div_week"]),
+            }, "Year"))
+        else:
+            with profile.span("chart render"):
+                st.image(ulty_charts.portfolio_chart_png(
+                    df["Year"].to_numpy(), df["End-of-Year Balance"].to_numpy(),
+                    df["Total Dividends (cum)"].to_numpy(), df["Next 12M Run-rate"].to_numpy(), label_currency))
+
+        # --- Weekly ledger ---
+        st.subheader("🧾 Weekly Ledger (ปันผล / หุ้นที่ซื้อ / guardrails รายสัปดาห์)")
+        if st.checkbox("Build weekly ledger", value=False):
+            with profile.span("weekly ledger"):
+                cols, (data, file_name, mime) = ulty_ledger.ledger_download(params)
+            ledger = pd.DataFrame(cols)
+            ledger["guardrails"] = [", ".join(n for bit, n in LEDGER_FLAG_NAMES if f & bit) for f in ledger["flags"]]
+            st.dataframe(ledger.drop(columns=["scenario", "flags"]).head(WEEKS_PER_YEAR * 2))
+            st.download_button(f"⬇️ Download ledger ({len(ledger):,} weeks)", data, file_name=file_name, mime=mime)
+
+        # --- Monte Carlo ---
+        st.subheader("🎲 Monte Carlo (หลายเส้นทางราคา/ปันผล)")
+        mc_on = st.checkbox("Run Monte Carlo simulation", value=False)
+        if mc_on:
+            mc_col1, mc_col2 = st.columns(2)
+            with mc_col1:
+                mc_paths = st.number_input("Number of paths", min_value=100, max_value=100_000, value=10_000, step=1_000)
+                mc_seed = st.number_input("Random seed", min_value=0, value=42, step=1)
+            with mc_col2:
+                mc_px_vol = st.number_input("Price volatility (%/yr)", value=30.0, min_value=0.0, step=5.0)
+                mc_div_vol = st.number_input("Dividend volatility (%/yr)", value=15.0, min_value=0.0, step=5.0)
+
+            with profile.span("monte carlo"):
+                mc = simulate_drip_mc(params, n_paths=int(mc_paths), px_vol=mc_px_vol / 100.0,
+                                      div_vol=mc_div_vol / 100.0, seed=int(mc_seed))
+            pct_labels = [f"P{q}" for q in mc["percentiles"]]
+            mc_summary = pd.DataFrame(
+                [mc["balance"][:, -1], mc["div_cum"][:, -1], mc["runrate"][:, -1]],
+                index=["End Balance", "Total Dividends (cum)", "Next 12M Run-rate"],
+                columns=pct_labels,
+            )
+            st.caption(f"{mc['n_paths']:,} paths, year {int(years_input)}")
+            st.dataframe(mc_summary.style.format(f"{label_currency}" + "{:,.2f}"))
+
+            if native_charts:
+                st.line_chart(ulty_charts.native_frame(
+                    df["Year"].to_numpy(), dict(zip(pct_labels, mc["balance"])), "Year",
+                    lower=pct_labels[:2], upper=pct_labels[-2:]))
+            else:
+                st.image(ulty_charts.mc_fan_chart_png(df["Year"].to_numpy(), mc["balance"], pct_labels, label_currency))
+
+        # --- Sensitivity grid ---
+        st.subheader("🧮 Sensitivity Grid (Price × Dividend Growth)")
+        sweep_on = st.checkbox("Run parameter sweep", value=False)
+        if sweep_on:
+            sw_col1, sw_col2 = st.columns(2)
+            with sw_col1:
+                sw_px_min = st.number_input("Price growth from (%/yr)", value=-30.0, step=5.0)
+                sw_px_max = st.number_input("Price growth to (%/yr)", value=10.0, step=5.0)
+                sw_px_step = st.number_input("Price growth step (%)", value=2.5, min_value=0.1, step=0.5)
+            with sw_col2:
+                sw_div_min = st.number_input("Dividend growth from (%/yr)", value=-20.0, step=5.0)
+                sw_div_max = st.number_input("Dividend growth to (%/yr)", value=5.0, step=5.0)
+                sw_div_step = st.number_input("Dividend growth step (%)", value=2.5, min_value=0.1, step=0.5)
+            sw_metric = st.selectbox("Heatmap metric", ["End-of-Year Balance", "YoC (initial)"], index=0)
+
+            px_axis = np.round(np.arange(sw_px_min, sw_px_max + sw_px_step / 2, sw_px_step), 4)
+            div_axis = np.round(np.arange(sw_div_min, sw_div_max + sw_div_step / 2, sw_div_step), 4)
+            if not px_axis.size or not div_axis.size:
+                st.warning("ช่วงค่าไม่ถูกต้อง: ค่าเริ่มต้น (from) ต้องไม่มากกว่าค่าสิ้นสุด (to)")
+            else:
+                with profile.span("sensitivity sweep"):
+                    sweep = sweep_drip(params, {"g_px": px_axis / 100.0, "g_div": div_axis / 100.0})
+                grid_values = sweep["balance"] if sw_metric == "End-of-Year Balance" else sweep["yoc_initial"]
+                st.caption(f"{grid_values.size:,} cells, {sweep['computed']:,} newly computed "
+                           f"(cache {len(SWEEP_CACHE):,} entries)")
+
+                st.image(ulty_charts.sweep_heatmap_png(grid_values, px_axis, div_axis, sw_metric, int(years_input)))
+
+# === MODE 5: Backtest ย้อนหลังด้วยข้อมูลจริง ===
+elif mode == "🕰️ Backtest ย้อนหลังด้วยข้อมูลจริง":
+    st.header("🕰️ Backtest DRIP ด้วยราคาและปันผลจริงของ ULTY")
+    pd = lazy_import("pandas")
+    ulty_backtest = lazy_import("ulty_backtest")
+    try:
+        with profile.span("backtest history"):
+            weekly_hist = ulty_backtest.get_weekly_series(ULTY_TICKER)
+    except Exception as e:
+        count_error("backtest.history", e)
+        weekly_hist = None
+        st.error(f"ไม่สามารถดึงข้อมูลย้อนหลังได้: {e}")
+
+    if weekly_hist is not None and not weekly_hist.empty:
+        currency = st.radio("💱 เลือกสกุลเงิน", ["THB", "USD"], horizontal=True)
+        first_day = weekly_hist.index[0].date()
+        last_day = weekly_hist.index[-1].date()
+        col1, col2 = st.columns(2)
+        with col1:
+            init_invest_input = st.text_input("💰 Initial Investment", value="100,000.00" if currency == "THB" else "3,000.00")
+            start_date = st.date_input("📅 Start date", value=first_day, min_value=first_day, max_value=last_day)
+        with col2:
+            extra_invest = st.number_input("➕ Extra Investment", value=0.0)
+            extra_invest_freq = st.selectbox("🗓️ Extra Invest Frequency", ["Weekly", "Monthly"], index=0)
+            end_date = st.date_input("📅 End date", value=last_day, min_value=first_day, max_value=last_day)
+        guardrails_on, price_floor_usd, cut_threshold_usd, cut_percent, max_shares_growth_y = guardrail_inputs()
+
+        is_thb = currency == "THB"
+        if is_thb and not exchange_rate:
+            st.error("❌ ไม่สามารถดึงอัตราแลกเปลี่ยน")
+        else:
+            exch = exchange_rate if is_thb else 1.0
+            label_currency = "฿" if is_thb else "$"
+            records = ulty_backtest.backtest_drip(
+                weekly_hist,
+                start=pd.Timestamp(start_date),
+                end=pd.Timestamp(end_date),
+                init_invest=parse_comma_input(init_invest_input),
+                exch=exch,
+                extra_invest=float(extra_invest),
+                extra_interval=1 if extra_invest_freq == "Weekly" else 4,
+                guardrails_on=guardrails_on,
+                price_floor_usd=price_floor_usd,
+                cut_threshold_usd=cut_threshold_usd,
+                cut_percent=cut_percent,
+                max_shares_growth_y=max_shares_growth_y,
+            )
+            if not records:
+                st.warning("ไม่มีข้อมูลในช่วงวันที่เลือก")
+            else:
+                df = pd.DataFrame(records)
+                if is_thb:
+                    st.caption(f"คำนวณด้วยอัตราแลกเปลี่ยนปัจจุบัน {exchange_rate} THB/USD")
+                st.subheader("📋 Backtest Results (ทุก 52 สัปดาห์)")
+                money = f"{label_currency}" + "{:,.2f}"
+                st.dataframe(df.style.format({
+                    "End Balance": money,
+                    "Dividends Received (period)": money,
+                    "Total Dividends (cum)": money,
+                    "Total Contributed": money,
+                    "Trailing 12M Dividends": money,
+                    "Price (end)": "${:,.4f}",
+                    "Shares (end)": "{:,.6f}",
+                }))
+                st.line_chart(df.set_index("Period End")[["End Balance", "Total Dividends (cum)", "Total Contributed"]])
+
+# === Startup / rerun profile ===
+with st.expander("⏱️ Startup / rerun profile"):
+    st.code("\n".join(f"{r['kind']:<7} {r['name']:<32} {r['seconds'] * 1000:>9.1f} ms"
+                      for r in profile.rows(ulty_market.FETCH_TIMINGS)))
+    ck = CHECKPOINTS.stats()
+    st.caption(f"DRIP checkpoints: {ck['entries']:,} entries, {ck['bytes'] / 2**20:.2f} MB, "
+               f"{ck['hits']:,} hits / {ck['misses']:,} misses")
+
+# === Debug: metrics (เปิดด้วย ?debug=1) ===
+if st.query_params.get("debug") == "1":
+    with st.expander("🐞 Metrics", expanded=True):
+        snap = ulty_metrics.METRICS.snapshot()
+        st.dataframe([{"metric": h["name"], "labels": ", ".join(f"{k}={v}" for k, v in h["labels"].items()),
+                       "count": h["count"], "mean ms": h["sum"] / h["count"] * 1000, "max ms": h["max"] * 1000}
+                      for h in snap["histograms"]])
+        st.dataframe([{"metric": c["name"], "labels": ", ".join(f"{k}={v}" for k, v in c["labels"].items()),
+                       "value": c["value"]} for c in snap["counters"]])
+        st.download_button("⬇️ Prometheus text", ulty_metrics.METRICS.prometheus(), file_name="ulty_metrics.txt")